@@ -1,13 +1,23 @@
 import os
-import json
+import re
+import hashlib
+import secrets
+import random
+import functools
+import orjson
+import asyncio
+import atexit
+import queue
 import logging
+import logging.handlers
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 # Web Framework
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 # Data Validation & Models
 from pydantic import BaseModel, Field
@@ -16,15 +26,16 @@ from pydantic import BaseModel, Field
 from chat_agent import get_chat_agent
 
 # Database
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, text
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Index, JSON, func, text, select, update, delete
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session, declarative_base, relationship
 from sqlalchemy.exc import IntegrityError, OperationalError
 
 # AI & Utilities
-from openai import OpenAI
-import pdfplumber
-import razorpay
-import requests
+from openai import AsyncOpenAI, AuthenticationError, BadRequestError, NotFoundError, PermissionDeniedError
+import httpx
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 # Authentication utilities
@@ -34,7 +45,8 @@ from auth_utils import (
     create_access_token,
     verify_token,
     validate_phone_number,
-    format_phone_number
+    format_phone_number,
+    pwd_context
 )
 
 # Price Optimizer
@@ -48,16 +60,35 @@ from price_optimizer import (
 
 # --- 1. CONFIGURATION & SETUP ---
 
+# Load environment variables from .env file (before logging setup - LOG_FORMAT/LOG_LEVEL may come from it)
+load_dotenv()
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+class JsonLogFormatter(logging.Formatter):
+    """One orjson-encoded object per line (LOG_FORMAT=json) - cheap to emit, easy to filter in Render logs"""
+    def format(self, record):
+        entry = {"ts": record.created, "lvl": record.levelname, "name": record.name, "msg": record.getMessage()}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+log_handler = logging.StreamHandler()
+if os.getenv("LOG_FORMAT", "text").lower() == "json":
+    log_handler.setFormatter(JsonLogFormatter())
+else:
+    log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+# Request paths only enqueue records; a listener thread formats and writes them to stderr.
+# Log calls use %-style args, so records below LOG_LEVEL are dropped before any string formatting
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flush queued records on shutdown
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))  # prepare() bakes args/traceback into msg; log_handler adds the rest
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[queue_handler])
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Configuration
 # DATABASE CONFIGURATION
 # 1. Try to get the Cloud Database URL (from Render/Neon)
@@ -81,13 +112,17 @@ else:
     # Add SSL requirement for Neon
     connect_args = {"sslmode": "require"}
 
+    # Behind a transaction-mode pooler (Neon's "-pooler" endpoint or PgBouncer, DB_POOLER=1) the server-side
+    # connections are shared across workers, so each process only needs a small client pool and no pre-ping
+    uses_pooler = "-pooler." in DATABASE_URL or os.getenv("DB_POOLER") == "1"
+
     # Production-grade connection pooling for Neon
     pool_config = {
-        "pool_size": 5,              # Max connections in pool
-        "max_overflow": 10,          # Extra connections beyond pool_size
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 2 if uses_pooler else 5)),        # Max connections in pool
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 5 if uses_pooler else 10)),  # Extra connections beyond pool_size
         "pool_timeout": 30,          # Wait 30s for connection
         "pool_recycle": 1800,        # Recycle connections every 30 min (Neon closes after inactivity)
-        "pool_pre_ping": True,       # Test connection before using
+        "pool_pre_ping": not uses_pooler,  # Test connection before using (the pooler already handles dead server connections)
     }
 
 # 2. CREATE ENGINE (Run this AFTER variables are set)
@@ -95,27 +130,114 @@ engine = create_engine(
     DATABASE_URL,
     connect_args=connect_args,
     **pool_config,
+    # JSON/JSONB columns (plans, groceries, profiles) are encoded and decoded with orjson instead of stdlib json
+    json_serializer=lambda value: orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode(),
+    json_deserializer=orjson.loads,
     echo=False  # Set to True for SQL query logging
 )
+IS_POSTGRES = engine.dialect.name == "postgresql"  # For the few dialect-specific statements
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_SECRET = os.getenv("RAZORPAY_SECRET")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")  # Optional - for recipe videos
 
-# Initialize AI Client with timeout settings for better performance
-client = OpenAI(
+@functools.cache
+def get_razorpay_client():
+    """Razorpay SDK is imported and its client built on the first checkout, then reused"""
+    import razorpay
+    return razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_SECRET))
+
+# Shared connection pool for AI calls - keeps TLS connections to OpenAI alive between requests
+AI_TIMEOUT = httpx.Timeout(120.0, connect=5.0)  # 2 minute timeout (prevent hanging), fail fast on connect
+ai_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60.0),
+    timeout=AI_TIMEOUT
+)
+
+# Shared pool for other third-party APIs (YouTube) - non-blocking, TLS handshake paid once
+api_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50),
+    timeout=10.0
+)
+
+# Initialize async AI Client on top of the shared pool so AI calls don't block the event loop
+client = AsyncOpenAI(
     api_key=OPENAI_API_KEY,
-    timeout=120.0,  # 2 minute timeout (prevent hanging)
-    max_retries=2   # Retry on transient errors
+    http_client=ai_http_client,
+    timeout=AI_TIMEOUT,
+    max_retries=2   # Retry on transient errors (swap-meal/weekly-checkin have no retry loop of their own)
+)
+
+# Client errors that retrying can't fix (everything else - timeouts, 429, 5xx, bad JSON - is retried)
+NON_RETRYABLE_AI_ERRORS = (AuthenticationError, BadRequestError, NotFoundError, PermissionDeniedError)
+
+# Every JSON-mode AI call uses the same model/format - bind them once (temperature is chosen per call)
+ai_json_completion = functools.partial(
+    client.chat.completions.create,
+    model="gpt-4o-mini",
+    response_format={"type": "json_object"}
+)
+
+# call_ai_json has its own retry loop (backoff, non-retryable errors) - SDK retries under it would multiply
+# the attempts per call, so its requests go through a client copy with them off
+ai_json_completion_no_retry = functools.partial(
+    client.with_options(max_retries=0).chat.completions.create,
+    model="gpt-4o-mini",
+    response_format={"type": "json_object"}
 )
 
-# Simple in-memory cache for recipe videos (avoids repeated API calls)
-recipe_video_cache = {}
+# Deterministic (temperature=0) call_ai_json results keyed by prompt hash - same report/plan in, same JSON out.
+# Stores the raw JSON text so every hit hands the caller a fresh dict it can mutate.
+ai_response_cache = TTLCache(maxsize=512, ttl=3600)
+
+def ai_cache_key(system_prompt: str, user_prompt: str, max_tokens: int, temperature: float,
+                 response_format: Optional[dict] = None) -> tuple:
+    """
+    Compact key for multi-KB prompts (16-byte digests instead of holding the full strings).
+    Covers every request argument call_ai_json varies, so two different requests never share a reply.
+    """
+    return (
+        hashlib.blake2b(system_prompt.encode(), digest_size=16).digest(),
+        hashlib.blake2b(user_prompt.encode(), digest_size=16).digest(),
+        max_tokens,
+        temperature,
+        hashlib.blake2b(orjson.dumps(response_format, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+    )
+
+# Bounded in-memory cache for recipe videos (avoids repeated API calls; LRU-evicted so it can't grow forever).
+# TTL so a video that gets taken down or outranked is re-fetched within a day.
+recipe_video_cache = TTLCache(maxsize=1000, ttl=24 * 3600)
+recipe_video_inflight = {}  # cache_key -> running YouTube fetch
+
+# Generated diet plans keyed by a hash of the plan-shaping profile fields (not name/phone).
+# The input space is small (age, stats, goal, diet, region...), so different users often share a key;
+# the prompts never include the name, so entries are name-free plans that address_plan personalises per user.
+diet_plan_cache = TTLCache(maxsize=1024, ttl=86400)
+
+# Meal-swap AI answers keyed on everything that reaches the prompt - popular meals repeat across users
+swap_meal_cache = TTLCache(maxsize=10000, ttl=86400)
+swap_meal_inflight = {}  # cache_key -> running task, so concurrent identical swaps share one AI call
+
+def singleflight(inflight: dict, key: str, make_coro):
+    """
+    Run make_coro() at most once per key at a time; concurrent callers with the same key
+    await the same task instead of firing duplicate upstream calls (cache stampede guard).
+    Shielded so one caller disconnecting doesn't cancel the work for the others.
+    """
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_coro())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return asyncio.shield(task)
 
 # Initialize FastAPI
 app = FastAPI(
     title="AI Ghar-Ka-Diet API",
+    default_response_class=ORJSONResponse,
     description="Backend for personalized diet and grocery generation",
     version="1.0.0",
     servers=[
@@ -124,6 +246,12 @@ app = FastAPI(
     ]
 )
 
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Release pooled upstream connections on shutdown"""
+    await ai_http_client.aclose()
+    await api_http_client.aclose()
+
 # --- 2. CORS MIDDLEWARE (CRUCIAL FOR REACT/NETLIFY) ---
 # Allow all origins for now - can restrict later with environment variable
 default_origins = "*"  # Allow all origins to fix CORS issues
@@ -146,23 +274,52 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Compress large JSON payloads (diet plans, grocery lists, login history).
+# Registered before the timing middleware so X-Process-Time wraps compression too.
+# Level 5 gets nearly all of level 9's ratio on repetitive plan JSON at a fraction of the CPU.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Add request timing middleware
-from fastapi import Request
+# Plain ASGI (not @app.middleware / BaseHTTPMiddleware): no extra task or Request/Response
+# wrapping per request - the header is injected straight into http.response.start.
+from fastapi import Response
 import time
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    logger.info(f"{request.method} {request.url.path} - {process_time:.2f}s")
-    return response
+class ProcessTimeMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/health":
+            return await self.app(scope, receive, send)  # Keep-alive pings: skip timing + log line
+
+        start_time = time.perf_counter()
+
+        async def send_with_time(message):
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                message.setdefault("headers", []).append((b"x-process-time", str(process_time).encode()))
+            await send(message)
+
+        await self.app(scope, receive, send_with_time)
+        logger.info("%s %s - %.2fs", scope["method"], scope["path"], time.perf_counter() - start_time)
+
+app.add_middleware(ProcessTimeMiddleware)
 
 # --- 3. DATABASE MODELS (SQLAlchemy) ---
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# JSON payload columns: JSONB on Postgres (stored pre-parsed, read back as dict/list), JSON text on SQLite.
+# Rows are written as dicts directly - no dumps()/loads() round-trip in the handlers.
+JsonType = JSON().with_variant(JSONB(), "postgresql")
+
+def load_json_column(value, default=None):
+    """JSON columns read back as dicts; tolerate raw strings from rows written before the JSONB migration"""
+    if isinstance(value, str):
+        return orjson.loads(value) if value else default
+    return default if value is None else value
+
 
 # Pydantic models for requests/responses
 
@@ -218,6 +375,7 @@ class SavePlanRequest(BaseModel):
     user_id: int
     phone: str
     title: str
+    plan_id: Optional[int] = None  # The plan_id /generate-diet returned; without it the user's latest plan is saved
 
 class ChatRequest(BaseModel):
     session_id: str  # user_id or plan_id for conversation tracking
@@ -241,14 +399,15 @@ class User(Base):
     security_key = Column(String, nullable=True)  # For password recovery
 
     # Store profile as JSON so we can update it if they change goals
-    profile_data = Column(Text)
-    medical_issues = Column(Text)
+    profile_data = Column(JsonType)
+    medical_issues = Column(JsonType)
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    # Relationships
-    diet_plans = relationship("DietPlan", back_populates="user")
-    orders = relationship("Order", back_populates="user")
+    # Relationships - raise instead of lazy-loading per row (N+1 guard);
+    # use selectinload()/joinedload() explicitly where related rows are needed
+    diet_plans = relationship("DietPlan", back_populates="user", lazy="raise_on_sql")
+    orders = relationship("Order", back_populates="user", lazy="raise_on_sql")
 
 class OTPVerification(Base):
     """OTP verification for phone-based authentication"""
@@ -265,19 +424,27 @@ class OTPVerification(Base):
 
 class DietPlan(Base):
     __tablename__ = "diet_plans"
+    __table_args__ = (
+        # "Plans for this user, newest first" (/login, /auth/my-plans) - Postgres scans it backwards for DESC
+        Index("ix_diet_plans_user_created", "user_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     
     title = Column(String, default="My Diet Plan") # <--- NEW COLUMN
-    plan_json = Column(Text)     
-    grocery_json = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    plan_json = Column(JsonType)
+    grocery_json = Column(JsonType)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # /admin/stats newest-first
     
-    user = relationship("User", back_populates="diet_plans")
-    orders = relationship("Order", back_populates="diet_plan")
+    user = relationship("User", back_populates="diet_plans", lazy="raise_on_sql")
+    orders = relationship("Order", back_populates="diet_plan", lazy="raise_on_sql")
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Per-user order history, newest first
+        Index("ix_orders_user_created", "user_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     diet_plan_id = Column(Integer, ForeignKey("diet_plans.id"))
@@ -290,16 +457,20 @@ class Order(Base):
     razorpay_payment_id = Column(String, nullable=True)
 
     shipping_address = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
-    user = relationship("User", back_populates="orders")
-    diet_plan = relationship("DietPlan", back_populates="orders")
+    user = relationship("User", back_populates="orders", lazy="raise_on_sql")
+    diet_plan = relationship("DietPlan", back_populates="orders", lazy="raise_on_sql")
 
 # --- AGENTIC AI MODELS ---
 
 class WeeklyCheckIn(Base):
     """Stores weekly user progress for tracking and adaptive recommendations"""
     __tablename__ = "weekly_checkins"
+    __table_args__ = (
+        # Check-ins are always fetched per plan ordered by week (/weekly-checkin, /progress-history)
+        Index("ix_weekly_checkins_plan_week", "diet_plan_id", "week_number"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -324,7 +495,7 @@ class WeeklyCheckIn(Base):
     notes = Column(Text, nullable=True)  # Additional user notes
 
     # AI-generated insights (stored after analysis)
-    ai_insights_json = Column(Text, nullable=True)  # JSON: {plateau, recommendations, adjustments}
+    ai_insights_json = Column(JsonType, nullable=True)  # JSON: {plateau, recommendations, adjustments}
 
     # Calorie adjustments (for adaptive agent)
     adjusted_calories = Column(Integer, nullable=True)  # New calorie target if adjusted
@@ -335,6 +506,10 @@ class WeeklyCheckIn(Base):
 class ProgressSnapshot(Base):
     """Daily/weekly aggregated metrics for trend analysis"""
     __tablename__ = "progress_snapshots"
+    __table_args__ = (
+        # Per-plan trend (asc) and latest snapshot (desc) lookups
+        Index("ix_progress_snapshots_plan_date", "diet_plan_id", "snapshot_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -365,6 +540,9 @@ class ProgressSnapshot(Base):
 class CalorieAdjustmentLog(Base):
     """Tracks all calorie adjustments made by the adaptive agent"""
     __tablename__ = "calorie_adjustments"
+    __table_args__ = (
+        Index("ix_calorie_adjustments_plan_date", "diet_plan_id", "adjustment_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -390,8 +568,21 @@ class CalorieAdjustmentLog(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
-# Create Tables
-Base.metadata.create_all(bind=engine)
+class RecipeVideo(Base):
+    """YouTube search results - second tier behind recipe_video_cache, so restarts/deploys and other workers reuse them"""
+    __tablename__ = "recipe_videos"
+
+    cache_key = Column(String, primary_key=True)  # Same key as recipe_video_cache (normalized meal + language)
+    video_json = Column(JsonType)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Create Tables - on by default (fresh local setups need it); set RUN_MIGRATIONS=0 on Render
+# once the schema exists so cold starts skip the DDL round-trips to Neon.
+# Runs at server startup, not import, so scripts/tools that import main don't touch the DB.
+@app.on_event("startup")
+def create_tables():
+    if os.getenv("RUN_MIGRATIONS", "1") == "1":
+        Base.metadata.create_all(bind=engine)
 
 # Dependency to get DB session
 def get_db():
@@ -402,7 +593,7 @@ def get_db():
         db.commit()  # Commit any pending changes
     except Exception as e:
         db.rollback()  # Rollback on error
-        logger.error(f"Database session error: {e}")
+        logger.error("Database session error: %s", e)
         raise
     finally:
         db.close()
@@ -412,11 +603,12 @@ def get_db():
 class UserProfile(BaseModel):
     name: str = "Guest"
     phone: str = "0000000000"  # <--- NEW: Vital for tracking
-    age: int
+    # Same bounds as the form inputs - impossible values get a 422 before any AI call
+    age: int = Field(..., ge=5, le=120)
     gender: str
-    height_cm: float
-    weight_kg: float
-    target_weight_kg: float  # Target Weight Goal - MANDATORY
+    height_cm: float = Field(..., ge=50, le=250)
+    weight_kg: float = Field(..., ge=20, le=300)
+    target_weight_kg: float = Field(..., ge=20, le=300)  # Target Weight Goal - MANDATORY
     goal: str
     goal_pace: str = "balanced"  # New field: conservative, balanced, rapid
     diet_pref: str
@@ -428,60 +620,446 @@ class OrderRequest(BaseModel):
     amount: int       # Amount in paise (e.g., 99900 for ₹999)
     currency: str = "INR"
 
+# --- AI PROMPT TEMPLATES ---
+# Built once at import; handlers only fill in the per-user fields.
+
+DIET_PROMPT_HEADER = """You are a nutrition planning engine for an Indian health platform. Generate a goal-oriented, medically-aware 7-day diet plan with CALCULATED nutrition targets and short, coach-like explanations.
+
+USER PROFILE
+- Age: {age}; Gender: {gender}
+- Stats: {height_cm}cm, {weight_kg}kg; Target weight: {target_weight_kg}kg ({weight_change:+.1f}kg {change_direction})
+- Goal: {goal}; Pace: {goal_pace} (conservative/balanced/rapid)
+- Diet: {diet_pref}; Region: {region}
+- Medical conditions: {medical}
+
+TARGET WEIGHT (hard constraint - every number must reach {target_weight_kg}kg safely)
+Safe weekly rate (kg/week):
+- Age <60: loss conservative 0.25-0.4, balanced 0.5-0.75, rapid 0.75-1; gain conservative 0.2-0.3, balanced 0.25-0.5, rapid 0.4-0.6
+- Age 60-64: loss conservative 0.25-0.4, balanced 0.4-0.6; gain conservative 0.2-0.3, balanced 0.3-0.5; no rapid
+- Age 65+: conservative only; loss 0.2-0.4, gain 0.15-0.3
+estimated_weeks = weight change / weekly rate. If over 52 weeks, use a conservative rate and explain the longer, sustainable timeframe. Target BMI must stay within 16-35.
+
+NUTRITION TARGETS (already calculated from the profile - use these exact numbers; never expose formulas or an exact TDEE)
+- Estimated maintenance: around {maintenance_low}-{maintenance_high} kcal
+- Daily calories: {calories_low}-{calories_high} kcal ({calorie_delta:+d} kcal/day vs maintenance)
+- Protein: {protein_low}-{protein_high}g
+calories_reasoning / protein_reasoning explain these targets for the goal, pace, age and any medical conditions. Age 65+: stress digestibility; never say "maximize protein".
+
+{medical_rules}
+
+CONTENT RULES
+- summary: start with "you're aiming to..." and never use a name (the app adds the user's name in front), then current -> target weight, timeline in weeks/months, why the plan works and any medical adjustments. No vague or unrealistic timelines.
+- Reasoning fields: 2-4 lines, encouraging coach tone. Age 60+: gentle, prioritise strength, energy and recovery.
+- Meals: portions for every dish (e.g. "2 Rotis + 1 cup Dal"); include early_morning, mid_morning and before_bed only when useful; vary meals across the 7 days; follow the regional balance below for {region}.
+- Regional balance (80/20): South Indian - 80% rice/idli/dosa, 20% roti (dinner); North Indian - 80% roti/paratha, 20% idli/dosa (breakfast); West/East Indian - balanced mix with regional staples.
+- Diet: Vegetarian - no meat, fish, eggs; Non-Veg - include meat/fish; Jain - no onion, garlic, root vegetables; Eggetarian - vegetarian plus eggs.
+- Activity (days/week) by age and goal: muscle gain <50 4-5 progressive strength, 50-64 3-4 moderate strength with good form, 65+ 2-3 light resistance/bands; weight loss <50 5-6 cardio + light strength, 50-64 4-5 walking + gentle strength, 65+ 3-4 light walking, chair exercises, stretching; maintenance <60 3-4 walking/yoga, 60+ 3-4 walking, stretching, balance; diabetes/medical 5 days of 30-45 min walks after meals.
+- Expected results: weekly change from the {calorie_delta:+d} kcal/day deficit/surplus (60-64 about 0.3-0.4kg/week loss, 65+ 0.2-0.3); muscle gain 0.25-0.5kg/month under 60, 0.2-0.3 at 60+; milestones = weekly change x 4 / 8 / 12 weeks; visible changes <40 3-4 weeks, 40-60 4-6, 60-64 5-7, 65+ 6-8; plateau - under 60 adjust 100-150 kcal after 8-12 weeks, 60+ focus on strength and energy.
+- Hydration about 0.03L per kg bodyweight. No extreme or unsafe advice.
+"""
+
+# The plan is written by three concurrent calls (overview, days 1-4, days 5-7) sharing the header above:
+# wall time is the slowest section instead of one 4000-token completion.
+DIET_OVERVIEW_PROMPT_TEMPLATE = DIET_PROMPT_HEADER + """
+OUTPUT JSON - this call writes the overview only; the daily meals are generated separately (replace every placeholder with calculated values):
+{{
+  "summary": "",
+  "target_weight_goal": {{"current_weight": {weight_kg}, "target_weight": {target_weight_kg}, "weight_change_needed": "+/-X kg", "estimated_weeks": "", "estimated_timeline": "e.g. 12-16 weeks", "target_bmi": "", "safety_note": "reassurance if over 6 months or age 65+"}},
+  "daily_targets": {{"calories": "{calories_low}-{calories_high} kcal", "calories_reasoning": "", "protein": "{protein_low}-{protein_high}g", "protein_reasoning": "", "carbs_guidance": "", "fats_guidance": "", "medical_adjustments": "specific changes, or 'None - standard healthy approach'", "adherence_note": "These targets can be adjusted by ±100 kcal based on your energy levels and how you feel. Consistency matters more than hitting exact numbers daily."}},
+  "activity_guidance": {{"training_frequency": "", "type": "", "beginner_tips": ""}},
+  "expected_results": {{"weekly_weight_change": "", "target_achievement": "", "visible_changes": "", "30_day_milestone": "", "60_day_milestone": "", "90_day_milestone": "", "reassessment_note": "", "plateau_warning": "or 'N/A' for maintenance"}},
+  "important_notes": {{"hydration": "", "sleep": "Aim for 7-8 hours of quality sleep", "medical_disclaimer": "", "reassessment": "Reassess plan every 4 weeks based on progress"}}
+}}"""
+
+DIET_DAYS_PROMPT_TEMPLATE = DIET_PROMPT_HEADER + """
+OUTPUT - this call writes only days {first_day}-{last_day} of the 7-day plan (JSON shape is enforced by the response schema); the other days and the overview are generated separately, so make every day here distinct. Leave a meal slot as "" when it isn't useful."""
+DIET_DAY_SPLITS = ((1, 4, 1800), (5, 7, 1400))  # (first day, last day, max_tokens)
+
+# Structured output for the day sections - the API constrains decoding to this shape, so it isn't described in the prompt
+DIET_MEAL_SLOTS = ("early_morning", "breakfast", "mid_morning", "lunch", "evening_snack", "dinner", "before_bed")
+DIET_DAYS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "diet_days",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"days": {"type": "array", "items": {
+                "type": "object",
+                "properties": {"day": {"type": "integer"}, **{slot: {"type": "string"} for slot in DIET_MEAL_SLOTS}},
+                "required": ["day", *DIET_MEAL_SLOTS],
+                "additionalProperties": False,
+            }}},
+            "required": ["days"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Per-condition diet rules - only the ones matching the user's conditions go into the prompt
+# Also lowers the protein band in nutrition_targets, so the kidney rule and the targets agree
+KIDNEY_CONDITION_RE = re.compile(r"kidney|renal|\bckd\b|creatinine|\begfr\b", re.IGNORECASE)
+
+MEDICAL_RULES = (
+    (re.compile(r"diabet|hba1c|glucose|blood sugar", re.IGNORECASE),
+     "Diabetes / high HbA1c: low GI carbs (millets, oats, brown rice), high fiber, protein every meal, eat every 3-4 hours. Avoid white rice, maida, sugar, juices; limit potatoes, white bread."),
+    (re.compile(r"thyroid|\btsh\b", re.IGNORECASE),
+     "Thyroid: hypo - iodine, selenium, zinc; limit raw cruciferous, excess soy. Hyper - calcium-rich, anti-inflammatory; limit iodine, caffeine."),
+    (re.compile(r"pcod|pcos", re.IGNORECASE),
+     "PCOD/PCOS: low GI, high fiber, omega-3, protein, cinnamon. Avoid refined carbs, sugar, trans fats; limit dairy, red meat."),
+    (re.compile(r"cholesterol|\bldl\b", re.IGNORECASE),
+     "High cholesterol: oats, barley, beans, nuts, olive oil, fatty fish, garlic. Avoid deep-fried, trans fats, processed meat; limit red meat, full-fat dairy, egg yolks (2-3/week)."),
+    (re.compile(r"hypertension|blood pressure|high bp", re.IGNORECASE),
+     "Hypertension: DASH - fruits, vegetables, whole grains, low-fat dairy, beetroot, garlic. Low sodium (no pickles, papad, packaged snacks), salt under 5g/day, limit caffeine."),
+    (re.compile(r"\bvit(amin)?\.? ?d3?\b", re.IGNORECASE),
+     "Low vitamin D: fatty fish, egg yolks, fortified milk, mushrooms, 15-20 min morning/evening sunlight."),
+    (re.compile(r"iron|anaemi|anemi|ha?emoglobin|ferritin", re.IGNORECASE),
+     "Low iron / anemia: spinach, beetroot, dates, jaggery (non-veg: liver, red meat in moderation) with vitamin C; no tea/coffee with meals."),
+    (re.compile(r"triglyceride", re.IGNORECASE),
+     "High triglycerides: omega-3, fiber, whole grains. Avoid refined carbs, sugar, alcohol, juices."),
+    (KIDNEY_CONDITION_RE,
+     "Kidney issues: keep protein to the target band above, never high-protein. Limit potassium (banana, coconut water, potato, tomato; soak and boil vegetables), phosphorus (cola, processed cheese, packaged foods, excess nuts/seeds) and sodium (salt under 5g/day, no pickles, papad, packaged snacks)."),
+)
+
+def medical_rules_block(conditions: List[str]) -> str:
+    """MEDICAL CONDITIONS section of the diet prompt, limited to the rules for these conditions"""
+    if not conditions:
+        return "MEDICAL CONDITIONS: none - standard healthy approach"
+    text = " | ".join(conditions)
+    rules = [rule for pattern, rule in MEDICAL_RULES if pattern.search(text)]
+    return "\n".join([
+        "MEDICAL CONDITIONS (adapt EVERY meal, replace trigger ingredients, list the changes in medical_adjustments)",
+        *("- " + rule for rule in rules),
+        "Conditions without a rule above: apply standard clinical diet guidance for them.",
+        "With several conditions satisfy all of them; if they conflict, take the conservative option.",
+    ])
+
+# Deterministic nutrition targets - computed here so the model doesn't do (and get wrong) the arithmetic.
+# Mifflin-St Jeor BMR, conservative activity multipliers (activity unknown), goal/pace/age adjustments.
+CALORIE_DEFICIT_PCT = {  # (age band, pace) -> fraction below maintenance for weight loss
+    ("<60", "conservative"): 0.175, ("<60", "balanced"): 0.225, ("<60", "rapid"): 0.325,
+    ("60-64", "conservative"): 0.125, ("60-64", "balanced"): 0.175,
+    ("65+", "conservative"): 0.125,
+}
+CALORIE_SURPLUS_KCAL = {  # (goal, pace) -> kcal above maintenance
+    ("muscle_gain", "conservative"): 275, ("muscle_gain", "balanced"): 350, ("muscle_gain", "rapid"): 450,
+    ("weight_gain", "conservative"): 350, ("weight_gain", "balanced"): 450, ("weight_gain", "rapid"): 550,
+}
+PROTEIN_G_PER_KG = {  # (age band, goal, pace or None) -> (low, high)
+    ("<60", "weight_loss", "conservative"): (1.4, 1.6), ("<60", "weight_loss", "balanced"): (1.6, 1.8),
+    ("<60", "weight_loss", "rapid"): (1.8, 2.0),
+    ("<60", "muscle_gain", "conservative"): (1.6, 1.8), ("<60", "muscle_gain", "balanced"): (1.7, 1.9),
+    ("<60", "muscle_gain", "rapid"): (1.8, 2.0),
+    ("<60", "weight_gain", "conservative"): (1.2, 1.4), ("<60", "weight_gain", "balanced"): (1.4, 1.6),
+    ("<60", "weight_gain", "rapid"): (1.6, 1.8),
+    ("<60", "maintenance", None): (1.2, 1.5), ("<60", "medical", None): (1.0, 1.3),
+    ("60-64", "weight_loss", None): (1.2, 1.4), ("60-64", "muscle_gain", None): (1.4, 1.6),
+    ("60-64", "weight_gain", None): (1.2, 1.4), ("60-64", "maintenance", None): (1.0, 1.3),
+    ("60-64", "medical", None): (1.0, 1.3),
+    ("65+", "weight_loss", None): (0.9, 1.1), ("65+", "muscle_gain", None): (1.0, 1.2),
+    ("65+", "weight_gain", None): (1.0, 1.2), ("65+", "maintenance", None): (0.9, 1.1),
+    ("65+", "medical", None): (0.8, 1.0),
+}
+
+def round_to(value: float, step: int) -> int:
+    return int(step * round(value / step))
+
+def compute_nutrition_targets(profile: UserProfile) -> dict:
+    """Maintenance, calorie and protein ranges for the diet prompt (all rounded, ranges as the prompt used to ask)"""
+    return dict(nutrition_targets(
+        profile.age, profile.gender.lower().startswith("m"), profile.weight_kg, profile.height_cm,
+        profile.goal.lower(), profile.goal_pace.lower(), bool(profile.medical_manual),
+        any(KIDNEY_CONDITION_RE.search(issue) for issue in profile.medical_manual),
+    ))
+
+@functools.lru_cache(maxsize=4096)
+def nutrition_targets(age: int, is_male: bool, weight_kg: float, height_cm: float, goal_text: str,
+                      pace: str, has_medical: bool, has_kidney_issue: bool) -> dict:
+    """Pure part of compute_nutrition_targets, memoized on the few profile fields it reads (callers get a copy)"""
+    age_band = "<60" if age < 60 else "60-64" if age < 65 else "65+"
+    goal = ("weight_loss" if "loss" in goal_text else "muscle_gain" if "muscle" in goal_text
+            else "weight_gain" if "gain" in goal_text else "maintenance")
+    # Rapid is under-60 only; 65+ is conservative only
+    pace = pace if pace in ("conservative", "balanced", "rapid") else "balanced"
+    if age_band == "60-64" and pace == "rapid":
+        pace = "balanced"
+    elif age_band == "65+":
+        pace = "conservative"
+
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + (5 if is_male else -161)
+    multiplier_low, multiplier_high = {"<60": (1.3, 1.4), "60-64": (1.25, 1.35), "65+": (1.2, 1.25)}[age_band]
+    maintenance = bmr * (multiplier_low + multiplier_high) / 2
+
+    if goal == "weight_loss":
+        target = maintenance * (1 - CALORIE_DEFICIT_PCT[(age_band, pace)])
+    elif goal in ("muscle_gain", "weight_gain"):
+        target = maintenance + CALORIE_SURPLUS_KCAL[(goal, pace)]
+    elif has_medical:
+        target = maintenance * 0.875
+    else:
+        target = maintenance
+    floor = {"<60": 1500 if is_male else 1200, "60-64": bmr * 1.10, "65+": bmr * 1.15}[age_band]
+    calories_low = round_to(max(target, floor), 50)
+
+    protein_goal = "medical" if goal == "maintenance" and has_medical else goal
+    protein_key = (age_band, protein_goal, pace if age_band == "<60" and protein_goal not in ("maintenance", "medical") else None)
+    protein_low_per_kg, protein_high_per_kg = PROTEIN_G_PER_KG[protein_key]
+    if has_kidney_issue:
+        protein_low_per_kg, protein_high_per_kg = 0.8, 1.0
+    protein_low = round_to(weight_kg * protein_low_per_kg, 5)
+    protein_high = min(max(round_to(weight_kg * protein_high_per_kg, 5), protein_low + 10), protein_low + 20)
+
+    return {
+        "maintenance_low": round_to(bmr * multiplier_low, 50),
+        "maintenance_high": round_to(bmr * multiplier_high, 50),
+        "calories_low": calories_low,
+        "calories_high": calories_low + 50,
+        "calorie_delta": round_to(calories_low + 25 - maintenance, 25),
+        "protein_low": protein_low,
+        "protein_high": protein_high,
+    }
+
+# Static instructions for /swap-meal - identical on every call so the prefix is cacheable;
+# the user message only carries the meal and the profile fields.
+SWAP_MEAL_SYSTEM_PROMPT = """You are a nutrition substitution engine. Generate 3 smart meal alternatives. Output ONLY valid JSON.
+
+**Rules:**
+1. Match macros (protein/carbs/fats) as closely as possible
+2. Respect diet preference (veg/non-veg/vegan)
+3. Use the user's regional ingredients primarily
+4. Consider the user's goal
+5. If medical conditions exist, avoid trigger foods
+
+**Output Format (JSON):**
+{
+  "alternatives": [
+    {
+      "name": "Alternative 1 Name",
+      "description": "2 items + 1 item",
+      "macro_match": "Similar protein (25g), Lower carbs",
+      "why": "Better for weight loss goal",
+      "diet_tag": "vegetarian"
+    },
+    {
+      "name": "Alternative 2 Name",
+      "description": "Detailed meal description",
+      "macro_match": "Higher protein (30g)",
+      "why": "Good for muscle recovery",
+      "diet_tag": "non-vegetarian"
+    },
+    {
+      "name": "Alternative 3 Name",
+      "description": "Another option",
+      "macro_match": "Same calories, more fiber",
+      "why": "Easier to prepare",
+      "diet_tag": "vegan"
+    }
+  ]
+}"""
+
+# Static instructions for /weekly-checkin. Sent as the system message so every check-in shares
+# an identical prefix (OpenAI prefix caching); only the week's numbers go in the user message.
+WEEKLY_CHECKIN_SYSTEM_PROMPT = """You are a nutrition AI analyzing a user's weekly progress. Provide personalized insights.
+
+TASK:
+1. Analyze progress (is it good, too fast, too slow, plateau?)
+2. Provide 3-5 SHORT, ACTIONABLE recommendations (bullet points)
+3. Suggest calorie adjustment if needed (return number or null)
+4. Keep tone SUPPORTIVE and MOTIVATING
+
+OUTPUT FORMAT (JSON):
+{
+  "progress_assessment": "1-2 sentences analyzing progress",
+  "is_on_track": true/false,
+  "plateau_detected": true/false,
+  "recommendations": [
+    "Recommendation 1",
+    "Recommendation 2",
+    "Recommendation 3"
+  ],
+  "calorie_adjustment": -100 or null (suggest adjustment amount, or null if no change needed),
+  "adjustment_reason": "plateau" or "too_fast" or "too_slow" or null,
+  "motivation_message": "Short encouraging message"
+}"""
+
+# Grocery list generation - static; the plan's meals go in the user prompt
+GROCERY_SYSTEM_PROMPT = """You are a grocery list generation AI for Indian households. Generate a SMART, BUDGET-CONSCIOUS shopping list from the meal plan.
+
+CRITICAL: Output MUST be valid JSON. Keep all text simple with no special chars.
+
+TASK: Analyze the 7-day meal plan and:
+1. Extract ALL unique ingredients mentioned
+2. Calculate REALISTIC weekly quantities based on actual meals (not generic estimates)
+3. Price items based on Indian market rates and actual quantities needed
+4. Identify budget optimization opportunities
+
+PRICING: estimated_price is Rs for the listed quantity at typical Indian market rates (basic spices Rs 30-50 per 100g).
+Common staples are re-priced server-side from a fixed rate table, so get names and quantities right.
+
+SMART CALCULATION LOGIC:
+1. Parse each meal and extract ingredients with context
+2. Estimate realistic weekly quantities:
+   - If "2 Rotis" appears 7 times → ~1.5kg atta needed
+   - If "1 cup Dal" appears 5 times → ~500g dal needed
+   - If "Paneer Sabzi" appears 2 times → ~300g paneer needed
+3. Calculate prices: quantity × unit_price
+4. Sum ALL individual item prices for total
+5. Budget level: "low" if total < 800, "moderate" if 800-1500, "high" if > 1500
+6. Find savings: suggest cheaper alternatives for expensive items
+
+EXAMPLE ANALYSIS:
+Meal: "2 Rotis + 1 cup Dal + Sabzi (Aloo Gobi)"
+→ Extract: Wheat flour (for rotis), Dal, Potato, Cauliflower, Spices
+→ Weekly quantity: If this meal repeats 3 times, you need portions accordingly
+
+OUTPUT FORMAT (JSON):
+{
+  "categories": [
+    {"name": "Vegetables", "items": [
+      {"name": "Tomato", "quantity": "2kg", "display": "2kg Tomato", "estimated_price": 100, "price_range": "Rs 90-120", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Day 1 Lunch", "Day 3 Dinner", "Day 5 Lunch"]}
+    ]},
+    {"name": "Dairy and Proteins", "items": [
+      {"name": "Milk", "quantity": "7L", "display": "7L Milk", "estimated_price": 420, "price_range": "Rs 385-490", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Daily breakfast"]}
+    ]},
+    {"name": "Grains and Pulses", "items": [
+      {"name": "Wheat Flour", "quantity": "2kg", "display": "2kg Atta", "estimated_price": 90, "price_range": "Rs 80-100", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Rotis - Multiple days"]}
+    ]},
+    {"name": "Spices and Oils", "items": [
+      {"name": "Cooking Oil", "quantity": "1L", "display": "1L Oil", "estimated_price": 180, "price_range": "Rs 150-200", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["All cooking"]}
+    ]}
+  ],
+  "budget_analysis": {
+    "total_estimated": [MUST CALCULATE: exact sum of ALL item estimated_price values],
+    "breakdown": {
+      "vegetables": [CALCULATE: sum of vegetable category items],
+      "dairy_proteins": [CALCULATE: sum of dairy and protein items],
+      "grains_pulses": [CALCULATE: sum of grains and pulses],
+      "spices": [CALCULATE: sum of spices/oils],
+      "other": [CALCULATE: sum of other items]
+    },
+    "budget_level": "[CALCULATE: low if total < 800, moderate if 800-1500, high if > 1500]",
+    "savings_potential": [CALCULATE: realistic savings amount if cheaper swaps exist, 0 otherwise],
+    "smart_swaps": [{"original": "Basmati Rice", "alternative": "Regular Rice", "savings": 60, "reason": "Similar nutrition lower cost"}]
+  },
+  "seasonal_summary": {"out_of_season_count": 0, "warnings": [], "message": "All items in season"},
+  "shopping_tips": ["Buy vegetables from local market for 20 percent savings", "Buy staples in bulk for 15 percent discount"]
+}
+
+CRITICAL RULES:
+- Analyze ACTUAL meals in the plan, don't use generic templates
+- Calculate quantities based on REAL consumption (e.g., if "2 Rotis" appear 14 times across week, estimate atta needed)
+- Price each item realistically based on quantity
+- Total MUST be exact sum of all items
+- Keep text simple, no special characters
+- Use null not empty string
+- Smart swaps should be practical and culturally appropriate
+"""
+
 # --- 5. AI HELPER FUNCTION ---
 
-def call_ai_json(system_prompt: str, user_prompt: str, max_retries: int = 2, max_tokens: int = 4000):
+async def call_ai_json(system_prompt: str, user_prompt: str, max_retries: int = 2, max_tokens: int = 4000, temperature: float = 0.7,
+                       response_format: Optional[dict] = None):
     """
     Helper to call OpenAI with JSON mode enforcement and retry logic.
     Optimized for performance with configurable max_tokens.
+    Use temperature=0 for extraction-style calls where the same input should give the same output.
+    response_format overrides JSON mode (e.g. a strict json_schema).
     """
+    # Sampled (temperature > 0) calls are meant to vary, so only deterministic ones are cached
+    cache_key = ai_cache_key(system_prompt, user_prompt, max_tokens, temperature, response_format) if temperature == 0 else None
+    if cache_key is not None:
+        cached = ai_response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("AI cache hit (max_tokens=%d)", max_tokens)
+            return orjson.loads(cached)
+
     start_time = time.time()
     for attempt in range(max_retries):
         try:
-            logger.info(f"Calling AI API (attempt {attempt + 1}/{max_retries}, max_tokens={max_tokens})")
+            logger.info("Calling AI API (attempt %d/%d, max_tokens=%d)", attempt + 1, max_retries, max_tokens)
             api_start = time.time()
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = await ai_json_completion_no_retry(
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=max_tokens  # Increased for complete responses
+                max_tokens=max_tokens,  # Increased for complete responses
+                temperature=temperature,
+                **({"response_format": response_format} if response_format else {})
             )
             api_elapsed = time.time() - api_start
-            logger.info(f"OpenAI API response received in {api_elapsed:.2f}s")
+            logger.info("OpenAI API response received in %.2fs", api_elapsed)
             content = response.choices[0].message.content
-            result = json.loads(content)
+            result = orjson.loads(content)
             elapsed = time.time() - start_time
             total_tokens = response.usage.total_tokens if hasattr(response, 'usage') and response.usage else 'N/A'
-            logger.info(f"AI API call successful in {elapsed:.2f}s (tokens: {total_tokens}, API time: {api_elapsed:.2f}s)")
+            logger.info("AI API call successful in %.2fs (tokens: %s, API time: %.2fs)", elapsed, total_tokens, api_elapsed)
+            if cache_key is not None and isinstance(result, dict) and "error" not in result:
+                ai_response_cache[cache_key] = content
             return result
+        except NON_RETRYABLE_AI_ERRORS as e:
+            # Bad key / bad request won't fix themselves - don't burn the backoff budget
+            logger.error("AI Error (not retryable): %s", e)
+            return {"error": "AI generation failed", "details": str(e)}
         except Exception as e:
-            logger.error(f"AI Error (attempt {attempt + 1}): {e}")
+            logger.error("AI Error (attempt %d): %s", attempt + 1, e)
             if attempt == max_retries - 1:
                 # Fallback JSON if all retries fail
                 return {"error": "AI generation failed", "details": str(e)}
-            time.sleep(0.5)  # Reduced wait time
+            # Exponential backoff with jitter so concurrent requests don't retry in lockstep
+            await asyncio.sleep(min(2 ** attempt, 8) + random.random() * 0.5)
     return {"error": "AI generation failed after retries"}
 
+DIET_DAYS_ATTEMPTS = 2
+
+async def call_ai_diet_days(prompt_fields: dict, user_prompt: str, first_day: int, last_day: int, max_tokens: int) -> dict:
+    """One day range of the plan; retried (then an error dict) unless it has exactly days first_day..last_day in order"""
+    system_prompt = DIET_DAYS_PROMPT_TEMPLATE.format(**prompt_fields, first_day=first_day, last_day=last_day)
+    expected = list(range(first_day, last_day + 1))
+    for attempt in range(DIET_DAYS_ATTEMPTS):
+        part = await call_ai_json(system_prompt, user_prompt, max_tokens=max_tokens, response_format=DIET_DAYS_RESPONSE_FORMAT)
+        if "error" in part:
+            return part
+        got = [day.get("day") for day in part.get("days", [])]
+        if got == expected:
+            return part
+        logger.warning("Diet days %d-%d came back as %s (attempt %d/%d)", first_day, last_day, got, attempt + 1, DIET_DAYS_ATTEMPTS)
+    return {"error": "AI generation failed", "details": f"days {first_day}-{last_day} were incomplete"}
+
+async def call_ai_diet_plan(prompt_fields: dict, user_prompt: str) -> dict:
+    """Overview and day ranges generated concurrently, merged into one plan (or the first part's error dict)"""
+    parts = await asyncio.gather(
+        call_ai_json(DIET_OVERVIEW_PROMPT_TEMPLATE.format(**prompt_fields), user_prompt, max_tokens=1500),
+        *(call_ai_diet_days(prompt_fields, user_prompt, first_day, last_day, max_tokens)
+          for first_day, last_day, max_tokens in DIET_DAY_SPLITS)
+    )
+    for part in parts:
+        if "error" in part:
+            return part
+    overview, *day_parts = parts
+    return {**overview, "days": [day for part in day_parts for day in part["days"]]}
+
 # --- 6. API ENDPOINTS ---
+# Handlers that only do blocking work (sync SQLAlchemy, sync OpenAI/Anthropic/Razorpay SDKs) are plain
+# `def` so FastAPI runs them in its threadpool; `async def` is kept for handlers that await or never block.
 
 @app.get("/")
-def home():
+async def home():
     return {"message": "AI Ghar-Ka-Diet Backend is Running!", "status": "active"}
 
 
-@app.get("/health")
-def health_check():
-    """Lightweight health check endpoint - fast response for monitoring"""
-    # Fast response without DB check for keep-alive pings
-    return {
-        "status": "healthy",
-        "service": "active",
-        "timestamp": datetime.now().isoformat()
-    }
+# Keep-alive pings (Render, UptimeRobot, landing page) only need a 200 - body and headers are built once.
+# no-store so every ping actually reaches the app and keeps the instance awake.
+HEALTH_HEADERS = {"Cache-Control": "no-store"}
+HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "active"})
+
+@app.api_route("/health", methods=["GET", "HEAD"])
+async def health_check():
+    """
+    Lightweight health check endpoint - fast response for monitoring (no DB check, no per-request work).
+    HEAD (e.g. `curl -I`) gets the same status and headers; the server drops the body.
+    """
+    return Response(content=HEALTH_BODY, media_type="application/json", headers=HEALTH_HEADERS)
 
 @app.get("/health/detailed")
 def health_check_detailed(db: Session = Depends(get_db)):
@@ -496,7 +1074,7 @@ def health_check_detailed(db: Session = Depends(get_db)):
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         raise HTTPException(status_code=503, detail="Database connection failed")
 
 
@@ -505,7 +1083,7 @@ def health_check_detailed(db: Session = Depends(get_db)):
 # ============================================================================
 
 @app.post("/auth/send-otp")
-async def send_otp_endpoint(request: SendOTPRequest, db: Session = Depends(get_db)):
+def send_otp_endpoint(request: SendOTPRequest, db: Session = Depends(get_db)):
     """
     Send OTP to user's phone number
 
@@ -555,7 +1133,7 @@ async def send_otp_endpoint(request: SendOTPRequest, db: Session = Depends(get_d
         sms_sent = send_otp(phone, otp_code)
 
         if not sms_sent:
-            logger.error(f"Failed to send OTP to {phone}")
+            logger.error("Failed to send OTP to %s", phone)
             # Don't fail the request - OTP is still in database for testing
 
         return {
@@ -568,12 +1146,12 @@ async def send_otp_endpoint(request: SendOTPRequest, db: Session = Depends(get_d
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error sending OTP: {e}")
+        logger.error("Error sending OTP: %s", e)
         raise HTTPException(status_code=500, detail="Failed to send OTP. Please try again.")
 
 
 @app.post("/auth/verify-otp")
-async def verify_otp_endpoint(request: VerifyOTPRequest, db: Session = Depends(get_db)):
+def verify_otp_endpoint(request: VerifyOTPRequest, db: Session = Depends(get_db)):
     """
     Verify OTP and authenticate user
 
@@ -651,11 +1229,11 @@ async def verify_otp_endpoint(request: VerifyOTPRequest, db: Session = Depends(g
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error verifying OTP: {e}")
+        logger.error("Error verifying OTP: %s", e)
         raise HTTPException(status_code=500, detail="Verification failed. Please try again.")
 
 
-async def get_current_user_from_token(authorization: str = Header(None), db: Session = Depends(get_db)):
+def get_current_user_from_token(authorization: str = Header(None), db: Session = Depends(get_db)):
     """
     Dependency function to get current user from Authorization header
     """
@@ -682,7 +1260,7 @@ async def get_current_user_from_token(authorization: str = Header(None), db: Ses
 
 
 @app.get("/auth/me")
-async def get_current_user_endpoint(token: str, db: Session = Depends(get_db)):
+def get_current_user_endpoint(token: str, db: Session = Depends(get_db)):
     """
     Get current authenticated user from token
 
@@ -719,7 +1297,7 @@ async def get_current_user_endpoint(token: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting user: {e}")
+        logger.error("Error getting user: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get user info")
 
 
@@ -728,7 +1306,7 @@ async def get_current_user_endpoint(token: str, db: Session = Depends(get_db)):
 # ============================================================================
 
 @app.post("/auth/signup")
-async def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db)):
+def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db)):
     """
     User signup with phone + password
     Zero cost, works immediately!
@@ -746,9 +1324,7 @@ async def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db))
         # Check if user already exists
         existing_user = db.query(User).filter(User.phone == phone).first()
 
-        # Hash password and security key
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        # Hash password and security key (bcrypt is deliberately slow - plain def keeps it in the threadpool)
         hashed_password = pwd_context.hash(request.password)
         hashed_security_key = pwd_context.hash(request.security_key)
 
@@ -766,7 +1342,7 @@ async def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db))
                 # Create JWT token
                 token = create_access_token(existing_user.id, phone)
 
-                logger.info(f"Existing user set password: {phone}")
+                logger.info("Existing user set password: %s", phone)
 
                 return {
                     "success": True,
@@ -802,7 +1378,7 @@ async def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db))
         # Create JWT token
         token = create_access_token(new_user.id, phone)
 
-        logger.info(f"New user signed up: {phone}")
+        logger.info("New user signed up: %s", phone)
 
         return {
             "success": True,
@@ -819,13 +1395,13 @@ async def signup_endpoint(request: SignupRequest, db: Session = Depends(get_db))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Signup error: {e}")
+        logger.error("Signup error: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Signup failed. Please try again.")
 
 
 @app.post("/auth/login")
-async def login_endpoint(request: LoginRequest, db: Session = Depends(get_db)):
+def login_endpoint(request: LoginRequest, db: Session = Depends(get_db)):
     """
     User login with phone + password
     Fast, simple, zero cost!
@@ -857,15 +1433,13 @@ async def login_endpoint(request: LoginRequest, db: Session = Depends(get_db)):
             )
 
         # Verify password
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-        logger.info(f"Verifying password for user: {phone}")
+        logger.info("Verifying password for user: %s", phone)
         try:
             password_valid = pwd_context.verify(request.password, user.password_hash)
-            logger.info(f"Password verification result: {password_valid}")
+            logger.info("Password verification result: %s", password_valid)
         except Exception as e:
-            logger.error(f"Password verification error: {e}")
+            logger.error("Password verification error: %s", e)
             raise HTTPException(status_code=500, detail=f"Password verification failed: {str(e)}")
 
         if not password_valid:
@@ -881,7 +1455,7 @@ async def login_endpoint(request: LoginRequest, db: Session = Depends(get_db)):
         plans = db.query(DietPlan).filter(DietPlan.user_id == user.id).all()
         is_new_user = len(plans) == 0
 
-        logger.info(f"User logged in: {phone}")
+        logger.info("User logged in: %s", phone)
 
         return {
             "success": True,
@@ -899,12 +1473,12 @@ async def login_endpoint(request: LoginRequest, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=500, detail="Login failed. Please try again.")
 
 
 @app.post("/auth/reset-password")
-async def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
     """
     Reset password using security key
     Allows users to reset their password if they forgot it
@@ -929,8 +1503,6 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
             )
 
         # Verify security key
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
         if not pwd_context.verify(request.security_key, user.security_key):
             raise HTTPException(
@@ -945,7 +1517,7 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
         user.password_hash = new_password_hash
         db.commit()
 
-        logger.info(f"Password reset successful for: {phone}")
+        logger.info("Password reset successful for: %s", phone)
 
         return {
             "success": True,
@@ -955,12 +1527,12 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Password reset error: {e}")
+        logger.error("Password reset error: %s", e)
         raise HTTPException(status_code=500, detail="Password reset failed. Please try again.")
 
 
 @app.post("/auth/change-password")
-async def change_password(
+def change_password(
     request: ChangePasswordRequest,
     current_user: dict = Depends(get_current_user_from_token),
     db: Session = Depends(get_db)
@@ -980,8 +1552,6 @@ async def change_password(
             )
 
         # Verify current password
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
         if not pwd_context.verify(request.old_password, user.password_hash):
             raise HTTPException(
@@ -996,7 +1566,7 @@ async def change_password(
         user.password_hash = new_password_hash
         db.commit()
 
-        logger.info(f"Password changed for user: {user.id}")
+        logger.info("Password changed for user: %s", user.id)
 
         return {
             "success": True,
@@ -1006,12 +1576,12 @@ async def change_password(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Change password error: {e}")
+        logger.error("Change password error: %s", e)
         raise HTTPException(status_code=500, detail="Password change failed. Please try again.")
 
 
 @app.put("/auth/profile")
-async def update_profile(
+def update_profile(
     request: UpdateProfileRequest,
     current_user: dict = Depends(get_current_user_from_token),
     db: Session = Depends(get_db)
@@ -1039,7 +1609,7 @@ async def update_profile(
         db.commit()
         db.refresh(user)
 
-        logger.info(f"Profile updated for user: {user.id}")
+        logger.info("Profile updated for user: %s", user.id)
 
         return {
             "success": True,
@@ -1055,12 +1625,12 @@ async def update_profile(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Update profile error: {e}")
+        logger.error("Update profile error: %s", e)
         raise HTTPException(status_code=500, detail="Profile update failed. Please try again.")
 
 
 @app.get("/auth/my-plans")
-async def get_my_plans(
+def get_my_plans(
     current_user: dict = Depends(get_current_user_from_token),
     db: Session = Depends(get_db)
 ):
@@ -1094,7 +1664,7 @@ async def get_my_plans(
                     "id": p.id,
                     "title": p.title,
                     "created_at": p.created_at.isoformat(),
-                    "diet": json.loads(p.plan_json)
+                    "diet": load_json_column(p.plan_json)
                 } for p in plans
             ]
         }
@@ -1102,33 +1672,64 @@ async def get_my_plans(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Fetch plans error: {e}")
+        logger.error("Fetch plans error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch plans. Please try again.")
 
 
+# Exact counts below this many rows, pg_class.reltuples (kept current by autovacuum) above it
+STATS_EXACT_COUNT_LIMIT = 100000
+APPROX_COUNTS_SQL = """
+    SELECT
+        (SELECT CASE WHEN reltuples >= :limit THEN reltuples::bigint ELSE (SELECT count(*) FROM users) END
+         FROM pg_class WHERE oid = 'users'::regclass) AS total_users,
+        (SELECT CASE WHEN reltuples >= :limit THEN reltuples::bigint ELSE (SELECT count(*) FROM diet_plans) END
+         FROM pg_class WHERE oid = 'diet_plans'::regclass) AS total_plans
+"""
+
 @app.get("/admin/stats")
 def get_stats(db: Session = Depends(get_db)):
     """Get database statistics - users, plans, etc."""
     try:
-        total_users = db.query(User).count()
-        total_plans = db.query(DietPlan).count()
-
-        # Get recent users (last 10)
-        recent_users = db.query(User).order_by(User.created_at.desc()).limit(10).all()
+        # Both counts in one round-trip (Neon RTT dominates here, not the COUNT itself)
+        if IS_POSTGRES:
+            # COUNT(*) is a full scan on Postgres - past STATS_EXACT_COUNT_LIMIT rows use the planner's
+            # estimate instead (the CASE only runs the subquery when the estimate is small or missing)
+            counts = db.execute(text(APPROX_COUNTS_SQL), {"limit": STATS_EXACT_COUNT_LIMIT}).one()
+        else:
+            counts = db.execute(select(
+                select(func.count()).select_from(User).scalar_subquery().label("total_users"),
+                select(func.count()).select_from(DietPlan).scalar_subquery().label("total_plans")
+            )).one()
+
+        # Get recent users (last 10) - Core select returns light Row tuples, no ORM hydration.
+        # Phone is masked in SQL (substr/|| work on both Postgres and SQLite) so the full number never leaves the DB
+        phone = func.nullif(User.phone, "")
+        masked_phone = (
+            func.substr(phone, 1, 4, type_=String) + "****" + func.substr(phone, func.length(phone) - 1, 2, type_=String)
+        ).label("phone")
+        recent_users = db.execute(
+            select(User.id, User.name, masked_phone, User.created_at)
+            .order_by(User.created_at.desc())
+            .limit(10)
+        ).all()
 
         # Get recent plans (last 10)
-        recent_plans = db.query(DietPlan).order_by(DietPlan.created_at.desc()).limit(10).all()
+        recent_plans = db.execute(
+            select(DietPlan.id, DietPlan.user_id, DietPlan.created_at)
+            .order_by(DietPlan.created_at.desc())
+            .limit(10)
+        ).all()
 
         return {
             "stats": {
-                "total_users": total_users,
-                "total_plans": total_plans
+                "total_users": counts.total_users,
+                "total_plans": counts.total_plans
             },
             "recent_users": [
                 {
                     "id": u.id,
                     "name": u.name,
-                    "phone": u.phone[:4] + "****" + u.phone[-2:] if u.phone else None,  # Masked
+                    "phone": u.phone,  # Already masked by the query
                     "created_at": u.created_at.isoformat()
                 } for u in recent_users
             ],
@@ -1141,41 +1742,101 @@ def get_stats(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        logger.error(f"Stats error: {e}")
+        logger.error("Stats error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# Admin-only endpoints compare this against the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin_token(x_admin_token: str = Header(None)):
+    """Dependency: reject the request unless X-Admin-Token matches ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/cache/clear", dependencies=[Depends(require_admin_token)])
+def clear_caches(db: Session = Depends(get_db)):
+    """Drop all AI/API result caches (e.g. after a prompt change) - the in-memory ones and the stored recipe videos"""
+    caches = {
+        "ai_responses": ai_response_cache,
+        "diet_plans": diet_plan_cache,
+        "swap_meals": swap_meal_cache,
+        "recipe_videos": recipe_video_cache,
+    }
+    cleared = {name: len(cache) for name, cache in caches.items()}
+    for cache in caches.values():
+        cache.clear()
+    try:
+        cleared["recipe_videos_stored"] = db.execute(delete(RecipeVideo)).rowcount
+        db.commit()
+    except Exception as e:  # e.g. recipe_videos not created yet (migrate_db_add_recipe_videos.py)
+        db.rollback()
+        logger.warning("Stored recipe videos not cleared: %s", e)
+    logger.info("Caches cleared: %s", cleared)
+    return {"success": True, "cleared": cleared}
+
+# Words that mark a PDF as a lab report. Matched as substrings in a single pass:
+# the lookahead lets overlapping keywords each be counted, like the old `in` scans.
+MEDICAL_KEYWORDS = frozenset(k.lower() for k in (
+    'hemoglobin', 'glucose', 'cholesterol', 'vitamin', 'blood', 'test', 'lab',
+    'pathology', 'hba1c', 'thyroid', 'tsh', 'hdl', 'ldl', 'triglycerides',
+    'creatinine', 'urea', 'platelet', 'wbc', 'rbc', 'hemato', 'serum',
+    'mg/dl', 'mmol', 'reference', 'range', 'normal', 'low', 'high'
+))
+MEDICAL_KEYWORD_RE = re.compile(
+    # Longest first, ties alphabetical - the set has no order, the pattern must be stable
+    "(?=(" + "|".join(re.escape(k) for k in sorted(MEDICAL_KEYWORDS, key=lambda k: (-len(k), k))) + "))",
+    re.IGNORECASE  # Scan page text as-is instead of lowercasing a copy of every page
+)
+
+def extract_report_text(pdf_file):
+    """
+    Blocking pdfplumber extraction (run in a worker thread). Reads page by page and
+    stops once we have enough keywords to validate AND enough text for the AI
+    (only 3500 chars are sent). Returns (text, distinct keywords found - capped at 3).
+    """
+    page_texts = []
+    text_length = 0
+    found_keywords = set()
+    import pdfplumber  # heavy (pdfminer) - loaded on the first report upload, not at boot
+
+    with pdfplumber.open(pdf_file) as pdf:
+        for page in pdf.pages:
+            extracted = page.extract_text()
+            if not extracted:
+                continue
+            page_texts.append(extracted)
+            text_length += len(extracted) + 1
+            # Validation only needs 3 distinct keywords - stop scanning once we have them
+            if len(found_keywords) < 3:
+                for m in MEDICAL_KEYWORD_RE.finditer(extracted):
+                    found_keywords.add(m.group(1).lower())
+                    if len(found_keywords) >= 3:
+                        break
+            if len(found_keywords) >= 3 and text_length >= 3500:
+                break
+    return "\n".join(page_texts), found_keywords
+
 @app.post("/upload-blood-report")
 async def analyze_blood_report(file: UploadFile = File(...)):
     """
     Extracts text from an uploaded PDF blood report and uses AI
     to find nutritional deficiencies. Validates that the PDF is actually a medical report.
     """
-    text_content = ""
     try:
-        # 1. Extract Text from PDF
-        with pdfplumber.open(file.file) as pdf:
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text_content += extracted + "\n"
-
+        # 1. Extract Text from PDF (pdfplumber is pure-Python and blocking - keep it off the event loop)
+        text_content, found_keywords = await asyncio.to_thread(extract_report_text, file.file)
         if not text_content:
             return {"error": "not_readable", "message": "Could not read text from PDF. Please ensure it's a clear, text-based PDF."}
 
         # 2. VALIDATE: Check if this is actually a medical/blood report
-        medical_keywords = [
-            'hemoglobin', 'glucose', 'cholesterol', 'vitamin', 'blood', 'test', 'lab',
-            'pathology', 'hba1c', 'thyroid', 'tsh', 'hdl', 'ldl', 'triglycerides',
-            'creatinine', 'urea', 'platelet', 'wbc', 'rbc', 'hemato', 'serum',
-            'mg/dl', 'mmol', 'reference', 'range', 'normal', 'low', 'high'
-        ]
-
-        text_lower = text_content.lower()
-        keyword_matches = sum(1 for keyword in medical_keywords if keyword in text_lower)
+        keyword_matches = len(found_keywords)
 
         # If less than 3 medical keywords found, likely not a blood report
         if keyword_matches < 3:
-            logger.warning(f"PDF validation failed: only {keyword_matches} medical keywords found")
+            logger.warning("PDF validation failed: only %s medical keywords found", keyword_matches)
             return {
                 "error": "not_medical",
                 "message": "This doesn't appear to be a blood report. Please upload a valid medical lab report containing test results.",
@@ -1233,859 +1894,314 @@ async def analyze_blood_report(file: UploadFile = File(...)):
             ]
         }
         """
-        analysis = call_ai_json(system_prompt, f"Report Text: {text_content[:3500]}") # Increased limit for better analysis
+        # temperature=0: reading values off a report is extraction, not creative writing
+        analysis = await call_ai_json(system_prompt, f"Report Text: {text_content[:3500]}", temperature=0) # Increased limit for better analysis
 
-        logger.info(f"Blood report analysis successful: {len(analysis.get('issues', []))} issues found")
+        logger.info("Blood report analysis successful: %s issues found", len(analysis.get('issues', [])))
         return analysis
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def upsert_profile_user(db: Session, profile: UserProfile) -> int:
+    """
+    Create or update the user behind a diet request; returns the user id (blocking DB work).
+    One INSERT ... ON CONFLICT (phone) DO UPDATE ... RETURNING round-trip instead of
+    SELECT + INSERT/UPDATE, and no race between two requests for the same new phone.
+    """
+    insert = pg_insert if IS_POSTGRES else sqlite_insert
+    stmt = insert(User).values(
+        name=profile.name,
+        phone=profile.phone,
+        profile_data=profile.model_dump(),  # JSON columns take the dict directly
+        medical_issues=profile.medical_manual
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.phone],
+        set_={
+            "name": stmt.excluded.name,
+            "profile_data": stmt.excluded.profile_data,
+            "medical_issues": stmt.excluded.medical_issues
+        }
+    ).returning(User.id)
+
+    user_id = db.execute(stmt).scalar_one()
+    db.commit()
+    logger.info("Upserted user: %s", user_id)
+    return user_id
+
+def diet_profile_key(profile: UserProfile) -> bytes:
+    """Canonical hash of everything that shapes the plan except who it's for"""
+    fields = profile.model_dump(exclude={"name", "phone"})
+    fields["medical_manual"] = sorted(fields["medical_manual"])  # Same conditions in any order -> same plan
+    return hashlib.blake2b(orjson.dumps(fields, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+SUMMARY_OPENING_YOU_RE = re.compile(r"\AYou(?=r?\b)")  # "You"/"Your" -> lowercase after "<name>, "
+
+def address_plan(plan: dict, name: str) -> dict:
+    """
+    Deep copy of a generated (name-free) plan with the user's name in front of the summary:
+    "you're aiming to..." -> "<name>, you're aiming to...". The AI never sees the name, so a
+    cached plan can't carry one user's details to another.
+    """
+    plan = orjson.loads(orjson.dumps(plan))  # Never hand out (or let callers mutate) the shared cached dict
+    summary = plan.get("summary")
+    name = name.strip()
+    if name and isinstance(summary, str) and summary:
+        plan["summary"] = f"{name}, " + SUMMARY_OPENING_YOU_RE.sub("you", summary, count=1)
+    return plan
+
+def save_diet_plan(db: Session, user_id: int, diet_plan_json: dict, title: str) -> int:
+    """Persist a generated plan; returns the plan id (blocking DB work)"""
+    db_plan = DietPlan(
+        user_id=user_id,
+        plan_json=diet_plan_json,
+        title=title
+    )
+    db.add(db_plan)
+    db.flush()  # INSERT ... RETURNING id - read it now instead of a refresh SELECT after commit
+    plan_id = db_plan.id
+    db.commit()
+    return plan_id
+
 @app.post("/generate-diet")
 async def generate_diet(profile: UserProfile, db: Session = Depends(get_db)):
     """
     Generates a plan where the SUMMARY explains the connection between Goal + Stats + Report.
     """
-    try:
-        logger.info(f"Generating diet plan for {profile.name} (phone: {profile.phone})")
+    logger.info("Generating diet plan for %s (phone: %s)", profile.name, profile.phone)
+
+    # 1. AI GENERATION - same plan-shaping profile seen recently? Reuse that plan, skip prompt + AI
+    cache_key = diet_profile_key(profile)
+    cached = diet_plan_cache.get(cache_key)
+    cached_plan = None
+    ai_task = None
+    if cached is not None:
+        logger.info("Diet plan cache hit for %s", profile.name)
+        cached_plan = cached
+    else:
+        # Fields for the prebuilt prompt templates, from this user's profile
+        medical = ", ".join(profile.medical_manual) if profile.medical_manual else "None"
+        prompt_fields = dict(
+            **profile.model_dump(exclude={"name", "phone"}),  # Prompts never carry who the plan is for
+            weight_change=profile.target_weight_kg - profile.weight_kg,
+            change_direction="loss" if profile.target_weight_kg < profile.weight_kg else "gain",
+            medical=medical,
+            medical_rules=medical_rules_block(profile.medical_manual),
+            **compute_nutrition_targets(profile)
+        )
 
-        # 1. LOGIC: Check Identity & Create/Update User
-        db_user = db.query(User).filter(User.phone == profile.phone).first()
+        # Optimized user prompt - concise but complete
+        user_prompt = f"""Generate diet plan for the user ({profile.age}y, {profile.gender}, {profile.weight_kg}kg, {profile.height_cm}cm).
+Goal: {profile.goal} ({profile.goal_pace} pace)
+Diet: {profile.diet_pref}, Region: {profile.region}
+Medical: {medical}
+Output the requested section of the 7-day plan (JSON format from the system prompt)."""
 
-        if db_user:
-            db_user.name = profile.name
-            db_user.profile_data = profile.json()
-            db_user.medical_issues = json.dumps(profile.medical_manual)
-            logger.info(f"Updated existing user: {db_user.id}")
-        else:
-            db_user = User(
-                name=profile.name,
-                phone=profile.phone,
-                profile_data=profile.json(),
-                medical_issues=json.dumps(profile.medical_manual)
-            )
-            db.add(db_user)
-            logger.info("Created new user")
+        # The prompt only needs the profile, so start the AI call now and let it
+        # overlap the user upsert round-trip below
+        start_time = time.time()
+        logger.info("Generating %s plan for %s", profile.goal, profile.name)
+        ai_task = asyncio.create_task(call_ai_diet_plan(prompt_fields, user_prompt))
 
-        db.commit()
-        db.refresh(db_user)
+    try:
+        # 2. LOGIC: Check Identity & Create/Update User (sync SQLAlchemy - run in a worker thread)
+        user_id = await asyncio.to_thread(upsert_profile_user, db, profile)
     except Exception as e:
-        logger.error(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         db.rollback()
+        if ai_task:
+            ai_task.cancel()  # No user to attach the plan to - don't pay for the tokens
         raise HTTPException(status_code=500, detail="Database error occurred")
 
-    # 2. AI GENERATION - COMPREHENSIVE NUTRITION PLANNING ENGINE WITH PRECISE CALCULATIONS
-    system_prompt = f"""You are a **nutrition planning engine** for a health and fitness web platform.
-Your task is to generate **goal-oriented, medically-aware, and outcome-driven diet plans** with PRECISE, CALCULATED nutrition targets and clear explanations.
+    try:
+        if ai_task:
+            diet_plan_json = await ai_task
+            elapsed = time.time() - start_time
+            logger.info("Diet plan generation completed in %.2fs", elapsed)
 
----
+            # Check for AI errors
+            if "error" in diet_plan_json:
+                logger.error("AI generation failed: %s", diet_plan_json)
+                raise HTTPException(status_code=500, detail="Failed to generate diet plan")
+            diet_plan_cache[cache_key] = diet_plan_json
+        else:
+            diet_plan_json = cached_plan
+        diet_plan_json = address_plan(diet_plan_json, profile.name)
 
-### 🔸 USER PROFILE
-- **Name:** {profile.name}
-- **Age:** {profile.age} years, **Gender:** {profile.gender}
-- **Current Stats:** {profile.height_cm}cm, {profile.weight_kg}kg
-- **Target Weight:** {profile.target_weight_kg}kg (Weight Change: {profile.target_weight_kg - profile.weight_kg:+.1f}kg)
-- **Goal:** {profile.goal}
-- **Goal Pace:** {profile.goal_pace} (conservative/balanced/rapid)
-- **Diet Preference:** {profile.diet_pref}
-- **Region:** {profile.region}
-- **Medical Conditions:** {profile.medical_manual if profile.medical_manual else "None"}
-
----
-
-### 🔸 TARGET WEIGHT GOAL SYSTEM (MANDATORY - NEW CORE FEATURE)
-
-**CRITICAL:** The user has specified a TARGET WEIGHT of **{profile.target_weight_kg}kg** (current: {profile.weight_kg}kg).
-
-**Weight Change Required:** {abs(profile.target_weight_kg - profile.weight_kg):.1f}kg {"loss" if profile.target_weight_kg < profile.weight_kg else "gain"}
+        # 3. SAVE PLAN - committed before responding, so every later request that uses plan_id
+        # (grocery, check-in, save-plan - on any worker) finds the row; the INSERT is a few ms next to the AI call
+        plan_id = await asyncio.to_thread(
+            save_diet_plan, db, user_id, diet_plan_json, f"{profile.goal} - {profile.region} Plan"
+        )
 
-**This target weight is a HARD CONSTRAINT and PRIMARY CONTROL VARIABLE. ALL calculations must:**
-1. ✅ Be designed to reach this target weight safely
-2. ✅ Calculate realistic timeline based on age and goal_pace
-3. ✅ Adjust weekly rate if target is too aggressive
-4. ✅ Maintain nutrition quality (calories, protein, macros) while reaching target
-5. ✅ Clearly explain timeline and expectations in Goal Summary
-
-**TIMELINE CALCULATION (INTERNAL - DO NOT EXPOSE FORMULAS):**
-
-Calculate safe weekly rate:
-- **Age < 60:**
-  - Weight Loss: conservative=0.25-0.4kg/week, balanced=0.5-0.75kg/week, rapid=0.75-1kg/week
-  - Weight Gain: conservative=0.2-0.3kg/week, balanced=0.25-0.5kg/week, rapid=0.4-0.6kg/week
-- **Age 60-64:**
-  - Weight Loss: conservative=0.25-0.4kg/week, balanced=0.4-0.6kg/week (no rapid)
-  - Weight Gain: conservative=0.2-0.3kg/week, balanced=0.3-0.5kg/week (no rapid)
-- **Age 65+:**
-  - Weight Loss: conservative ONLY=0.2-0.4kg/week
-  - Weight Gain: conservative ONLY=0.15-0.3kg/week
-
-Calculate: `estimated_weeks = weight_change / weekly_rate`
-
-**If estimated timeline is unrealistic (>52 weeks), automatically:**
-- Adjust to a sustainable longer timeframe
-- Use conservative weekly rate
-- Explain in Goal Summary: "Your target is achievable over X months with a safe, sustainable approach"
-
-**VALIDATION BEFORE PROCEEDING:**
-- Is target weight medically safe? (BMI 16-35 range)
-- Is weekly rate appropriate for age?
-- Have I calculated a realistic timeline?
-- Does calorie deficit/surplus align with weekly rate?
-
----
-
-### 🔸 CRITICAL: CALCULATE PERSONALIZED METRICS (DO NOT USE TEMPLATES!)
-
-You MUST calculate the following based on the user's **actual stats, age, gender, target weight, and goal**. NO generic ranges!
-
-#### STEP 1: Calculate BMR (Basal Metabolic Rate)
-Use Mifflin-St Jeor Formula:
-- **Men:** BMR = (10 × weight_kg) + (6.25 × height_cm) - (5 × age) + 5
-- **Women:** BMR = (10 × weight_kg) + (6.25 × height_cm) - (5 × age) - 161
-
-For this user:
-- Gender: {profile.gender}
-- Weight: {profile.weight_kg}kg
-- Height: {profile.height_cm}cm
-- Age: {profile.age}
-
-**Calculate their exact BMR now.**
-
-#### STEP 2: Estimate TDEE (Total Daily Energy Expenditure)
-**CRITICAL: Since activity level is NOT explicitly provided, use CONSERVATIVE estimates!**
-
-Activity multipliers (reference):
-- Sedentary (office job, minimal movement): BMR × 1.2
-- Light activity (light walks, standing): BMR × 1.3-1.4
-- Moderate (regular exercise 3-4x/week): BMR × 1.5-1.55
-- Active (intense training 5-6x/week): BMR × 1.65-1.75
-
-**DEFAULT ASSUMPTION (be conservative):**
-- **Age < 60:** Use BMR × 1.3-1.4 (light activity) - DO NOT assume moderate!
-- **Age 60-64:** Use BMR × 1.25-1.35 (reduced activity assumption)
-- **Age 65+:** Use BMR × 1.2-1.25 (sedentary for safety)
-
-**IMPORTANT FOR EXPLANATIONS:**
-- DO NOT state a precise TDEE number (e.g., "your TDEE is 2100 kcal")
-- Instead use: "estimated maintenance calories" or "maintenance range of X-Y kcal"
-- This accounts for individual variation in daily movement
-
-#### STEP 3: Adjust Calories Based on Goal, Goal Pace, AND AGE
-Goal: {profile.goal}
-Goal Pace: {profile.goal_pace}
-Age: {profile.age}
-
-**CRITICAL AGE-BASED SAFETY GUARDRAILS:**
-
-**For users AGE 65+ (MANDATORY RULES):**
-- DISABLE "rapid" pace for weight loss - force conservative approach
-- Minimum calories = BMR × 1.15 (NEVER at or below BMR)
-- Maximum deficit = 10-15% (gentle, stress-aware)
-- Prioritize muscle preservation, energy, and recovery over speed
-- Explanation MUST emphasize safety: "At this age, maintaining strength and energy is prioritized over rapid fat loss"
-
-**For users AGE 60-64:**
-- Allow conservative and balanced paces only
-- Minimum calories = BMR × 1.10
-- Maximum deficit = 15-20%
-- Gentle messaging about sustainable progress
+        logger.info("Plan created successfully: %s", plan_id)
 
-**For users AGE < 60:**
-- All paces available
-- Minimum calories = 1200 kcal (women) or 1500 kcal (men)
-- Follow standard deficit/surplus rules below
-
----
-
-**DEFICIT/SURPLUS RULES BY AGE GROUP:**
-
-**For Weight Loss (Age < 60):**
-- **Conservative:** ~15-20% deficit from estimated maintenance = ~0.25-0.5kg/week loss
-- **Balanced:** ~20-25% deficit from estimated maintenance = ~0.5-0.75kg/week loss
-- **Rapid:** ~30-35% deficit from estimated maintenance = ~0.75-1kg/week loss (max)
-
-**For Weight Loss (Age 60-64):**
-- **Conservative:** ~10-15% deficit = ~0.25-0.4kg/week loss
-- **Balanced:** ~15-20% deficit = ~0.4-0.6kg/week loss
-- **Rapid:** NOT ALLOWED - default to balanced
-
-**For Weight Loss (Age 65+):**
-- **Conservative ONLY:** ~10-15% deficit = ~0.2-0.4kg/week loss
-- **Balanced/Rapid:** NOT ALLOWED - default to conservative
-- Minimum = BMR × 1.15 (non-negotiable safety floor)
+        return {
+            "user_id": user_id,
+            "plan_id": plan_id,
+            "diet": diet_plan_json
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error generating plan: %s", e)
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to generate and save plan")
 
-**For Muscle Gain (All Ages):**
-- **Conservative:** +250-300 kcal surplus (lean gains)
-- **Balanced:** +300-400 kcal surplus (steady progress)
-- **Rapid:** +400-500 kcal surplus (age < 60 only)
+# --- GROCERY PRICING ---
+# Indian market rates for staples (Rs low, high per unit). Items the model lists are re-priced from this
+# table so totals are reproducible; anything not in it keeps the model's estimate.
+PRICE_TABLE = {
+    # Leafy greens (Rs 20-30 per 250g bunch)
+    "spinach": (80, 120, "kg"), "palak": (80, 120, "kg"), "methi": (80, 120, "kg"),
+    "fenugreek": (80, 120, "kg"), "coriander": (80, 120, "kg"), "mint": (80, 120, "kg"),
+    # Common vegetables
+    "tomato": (30, 60, "kg"), "onion": (30, 60, "kg"), "potato": (30, 60, "kg"), "capsicum": (30, 60, "kg"),
+    "cauliflower": (30, 60, "kg"), "cabbage": (30, 60, "kg"), "carrot": (30, 60, "kg"),
+    "cucumber": (30, 60, "kg"), "lauki": (30, 60, "kg"), "bottle gourd": (30, 60, "kg"), "brinjal": (30, 60, "kg"),
+    # Premium vegetables
+    "broccoli": (80, 150, "kg"), "zucchini": (80, 150, "kg"), "mushroom": (80, 150, "kg"),
+    # Fruits
+    "banana": (40, 80, "kg"), "apple": (40, 80, "kg"), "papaya": (40, 80, "kg"),
+    "berries": (150, 300, "kg"), "avocado": (150, 300, "kg"), "pomegranate": (150, 300, "kg"),
+    # Dairy and proteins
+    "milk": (55, 70, "l"), "paneer": (350, 450, "kg"), "curd": (80, 120, "kg"), "yogurt": (80, 120, "kg"),
+    "dahi": (80, 120, "kg"), "eggs": (70, 90, "dozen"), "egg": (70, 90, "dozen"),
+    "chicken": (180, 220, "kg"), "fish": (250, 400, "kg"), "tofu": (250, 350, "kg"),
+    # Grains and pulses
+    "rice": (50, 80, "kg"), "basmati": (100, 150, "kg"), "atta": (40, 50, "kg"), "wheat flour": (40, 50, "kg"),
+    "oats": (240, 320, "kg"), "dal": (100, 150, "kg"), "lentils": (100, 150, "kg"), "quinoa": (500, 700, "kg"),
+    # Oils
+    "oil": (150, 200, "l"), "ghee": (600, 800, "kg"),
+    # Other
+    "nuts": (1000, 2000, "kg"), "almonds": (1000, 2000, "kg"), "walnuts": (1000, 2000, "kg"),
+    "dry fruits": (1500, 3000, "kg"), "bread": (40, 50, "loaf"), "protein powder": (1500, 3000, "kg"),
+}
 
-**For Weight Gain (All Ages):**
-- **Conservative:** +300-400 kcal
-- **Balanced:** +400-500 kcal
-- **Rapid:** +500-600 kcal (age < 60 only)
+# Longest names first so "wheat flour" / "basmati" win over shorter overlapping keys
+PRICE_ITEM_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(k) for k in sorted(PRICE_TABLE, key=lambda k: (-len(k), k))) + r")(?!\w)",
+    re.IGNORECASE
+)
+# "2kg", "1.5 kg", "500g", "7L", "1 dozen", "12 pieces", "2 bunches", "1 loaf",
+# plus fractions ("1/2 kg", "1 1/2 kg") and a pack count in front ("2 x 500g")
+QUANTITY_RE = re.compile(
+    r"(?<![\d./])(?:(?P<count>\d+)\s*[x×*]\s*)?(?:(?P<whole>\d+)\s+(?=\d+\s*/))?"
+    r"(?P<amount>\d+(?:\.\d+)?)(?:\s*/\s*(?P<denominator>\d+))?\s*"
+    r"(?P<unit>kg|kgs|g|gm|gms|grams?|l|ltr|litres?|liters?|ml|dozen|pcs|pieces?|bunch(?:es)?|loaf|loaves)\b",
+    re.IGNORECASE
+)
+ANY_DIGIT_RE = re.compile(r"\d")
+# Quantity unit -> (table unit, multiplier)
+QUANTITY_UNITS = {
+    "kg": ("kg", 1), "kgs": ("kg", 1), "g": ("kg", 0.001), "gm": ("kg", 0.001), "gms": ("kg", 0.001),
+    "gram": ("kg", 0.001), "grams": ("kg", 0.001), "bunch": ("bunch", 1), "bunches": ("bunch", 1),
+    "l": ("l", 1), "ltr": ("l", 1), "litre": ("l", 1), "litres": ("l", 1), "liter": ("l", 1), "liters": ("l", 1),
+    "ml": ("l", 0.001), "dozen": ("dozen", 1), "loaf": ("loaf", 1), "loaves": ("loaf", 1),
+    "pcs": ("dozen", 1 / 12), "piece": ("dozen", 1 / 12), "pieces": ("dozen", 1 / 12),  # only eggs are priced per count
+}
+# Only leafy greens and herbs are sold by the bunch (~250g); a "bunch" of anything else keeps the AI price
+BUNCH_KG = 0.25
+BUNCH_ITEMS = frozenset(("spinach", "palak", "methi", "fenugreek", "coriander", "mint"))
+
+def price_grocery_item(item: dict) -> bool:
+    """Re-price one grocery item from PRICE_TABLE in place; False if the name or quantity isn't recognised"""
+    name_match = PRICE_ITEM_RE.search(item.get("name") or "")
+    quantity = str(item.get("quantity") or "")
+    quantity_match = QUANTITY_RE.search(quantity)
+    if not name_match or not quantity_match:
+        return False
+    # Numbers outside the parsed quantity ("500g x 2", "2 packs (500g)") could change the amount - keep the AI price
+    if ANY_DIGIT_RE.search(quantity[:quantity_match.start()] + quantity[quantity_match.end():]):
+        return False
+    item_key = name_match.group(1).lower()
+    low, high, unit = PRICE_TABLE[item_key]
+    quantity_unit, multiplier = QUANTITY_UNITS[quantity_match["unit"].lower()]
+    if quantity_unit == "bunch" and item_key in BUNCH_ITEMS:
+        quantity_unit, multiplier = "kg", BUNCH_KG
+    denominator = int(quantity_match["denominator"] or 1)
+    if quantity_unit != unit or denominator == 0:
+        return False
+    amount = int(quantity_match["whole"] or 0) + float(quantity_match["amount"]) / denominator
+    amount *= int(quantity_match["count"] or 1) * multiplier
+    item["estimated_price"] = int(round(amount * (low + high) / 2))
+    item["price_range"] = f"Rs {int(round(amount * low))}-{int(round(amount * high))}"
+    return True
+
+# Breakdown bucket -> category-name keywords, checked in this order; unmatched categories go to "other"
+GROCERY_BUCKET_KEYWORDS = {
+    "vegetables": ("vegetable",),
+    "dairy_proteins": ("dairy", "protein", "meat", "chicken", "fish", "egg", "paneer", "milk", "yogurt", "curd"),
+    "grains_pulses": ("grain", "pulse", "dal", "rice", "wheat", "atta", "flour"),
+    "spices": ("spice", "oil", "masala"),
+}
 
-**For Balanced Diet / Maintenance (All Ages):**
-- Calories = estimated maintenance (ignore goal_pace)
-
-**For Medical Conditions (All Ages):**
-- Calories = estimated maintenance - 10-15% (mild deficit, conservative)
-- Never below BMR × 1.10
+# All keywords in one alternation, one named group per bucket - a single scan finds every bucket a name mentions
+GROCERY_BUCKET_RE = re.compile("|".join(
+    f"(?P<{bucket}>" + "|".join(map(re.escape, keywords)) + ")" for bucket, keywords in GROCERY_BUCKET_KEYWORDS.items()
+))
+
+@functools.lru_cache(maxsize=256)
+def grocery_bucket(category_name: str) -> str:
+    """budget_analysis.breakdown bucket for a (lowercased) grocery category name - the model reuses a handful of names"""
+    matched = {m.lastgroup for m in GROCERY_BUCKET_RE.finditer(category_name)}
+    # Table order decides ties ("Dairy and Vegetables" is vegetables, as before)
+    return next((bucket for bucket in GROCERY_BUCKET_KEYWORDS if bucket in matched), "other")
+
+def save_grocery_list(db: Session, plan_id: int, grocery_data: dict):
+    """Store a generated grocery list on its plan"""
+    db.execute(
+        update(DietPlan)
+        .where(DietPlan.id == plan_id)
+        .values(grocery_json=grocery_data)
+    )
+    db.commit()
 
-**CALCULATION VALIDATION (CRITICAL - MUST FOLLOW):**
-1. Calculate BMR using Mifflin-St Jeor
-2. Apply AGE-BASED safety check FIRST
-3. Estimate TDEE range based on age multiplier
-4. Take the MIDPOINT of TDEE range for calculations
-5. Apply deficit/surplus based on goal_pace AND age restrictions
-6. Ensure final calories ≥ BMR × (1.15 for 65+, 1.10 for 60-64, or standard floor)
-7. Round to nearest 50 kcal
-8. Create a 50-80 kcal range around the target
+@app.post("/generate-grocery/{plan_id}")
+async def generate_grocery(plan_id: int, db: Session = Depends(get_db)):
+    """
+    Retrieves a diet plan and converts it into a consolidated grocery list with:
+    - Price estimates and budget analysis
+    - Seasonal availability warnings
+    - Smart swap suggestions
+    - Multi-store price comparison
+    - Bulk buying optimization
+    - Expiry date warnings
+    - Shopping route optimization
+    """
+    # 1. Fetch Plan (only the columns we need - read-only Core select, in a worker thread)
+    plan = (await asyncio.to_thread(
+        db.execute, select(DietPlan.id, DietPlan.plan_json).where(DietPlan.id == plan_id)
+    )).first()
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
 
-**Example (29M, 83kg, 177cm, Weight Loss, Balanced):**
-BMR = 1836 kcal → Age < 60 → TDEE range = 2387-2570 kcal → Midpoint 2479 → Balanced deficit (22.5%) = 1922 → Final: **1900-1950 kcal**
-
-**Example (68F, 60kg, 160cm, Weight Loss, Balanced):**
-BMR = 1139 kcal → Age 65+ → FORCED conservative → TDEE range = 1367-1424 kcal → Midpoint 1396 → Conservative deficit (12.5%) = 1221 → Safety floor check: BMR × 1.15 = 1310 → Final: **1300-1350 kcal**
-**Explanation:** "At your age, we've set a gentle calorie level that prioritizes maintaining strength and energy while supporting gradual fat loss. This conservative approach helps with recovery and adherence."
-
-#### STEP 4: Calculate Protein Based on Age, Goal, Goal Pace, and Body Weight
-**CRITICAL: Use AGE-APPROPRIATE, EVIDENCE-BASED protein ranges!**
-
-User Stats: {profile.weight_kg}kg, {profile.age}y, Goal: {profile.goal}, Pace: {profile.goal_pace}
-
-**AGE-BASED PROTEIN GUIDELINES (evidence-based, medically sound):**
-
-**FOR ADULTS AGE < 65:**
-
-**Weight Loss:**
-- **Conservative:** 1.4-1.6g per kg bodyweight (muscle preservation during deficit)
-- **Balanced:** 1.6-1.8g per kg bodyweight (optimal muscle retention)
-- **Rapid:** 1.8-2.0g per kg bodyweight (only if training 3+ times/week)
-
-**Muscle Gain:**
-- **Conservative:** 1.6-1.8g per kg bodyweight (sustainable lean gains)
-- **Balanced:** 1.7-1.9g per kg bodyweight (good for regular training)
-- **Rapid:** 1.8-2.0g per kg bodyweight (active training 5-6x/week)
-
-**Weight Gain (general):**
-- **Conservative:** 1.2-1.4g per kg bodyweight
-- **Balanced:** 1.4-1.6g per kg bodyweight
-- **Rapid:** 1.6-1.8g per kg bodyweight
-
-**Maintenance / Balanced Diet:**
-- 1.2-1.5g per kg bodyweight (health-focused)
-
-**Medical Conditions:**
-- 1.0-1.3g per kg (unless kidney issues, then 0.8-1.0g per kg)
-
----
-
-**FOR ADULTS AGE 65+ (CRITICAL - DIFFERENT RULES):**
-
-**Weight Loss (conservative only):**
-- 0.9-1.1g per kg bodyweight
-- Prioritize digestibility and muscle preservation over aggression
-- NEVER exceed 1.2g/kg unless under medical supervision
-
-**Maintenance / Balanced Diet:**
-- 0.9-1.1g per kg bodyweight
-- Adequate for muscle maintenance and sarcopenia prevention
-- Higher end if regularly active
-
-**Weight Gain / Muscle Gain:**
-- 1.0-1.2g per kg bodyweight (max)
-- Focus on high-quality, easily digestible protein sources
-
-**Medical Conditions:**
-- 0.8-1.0g per kg (kidney-friendly, gentle)
-- Conservative to reduce metabolic stress
-
-**EXPLANATION REQUIREMENTS FOR AGE 65+:**
-- Must emphasize digestibility and achievability
-- Use phrases like: "This moderate protein level supports muscle maintenance without overwhelming digestion"
-- Avoid aggressive language like "maximize protein" or "high protein"
-
----
-
-**FOR ADULTS AGE 60-64 (TRANSITION GROUP):**
-
-Use intermediate ranges between <60 and 65+ groups:
-- Weight loss: 1.2-1.4g per kg
-- Maintenance: 1.0-1.3g per kg
-- Muscle gain: 1.4-1.6g per kg
-
----
-
-**CALCULATION RULES:**
-1. CHECK AGE FIRST - apply appropriate age bracket
-2. Calculate: weight × lower_multiplier and weight × higher_multiplier
-3. Round to nearest 5g
-4. Keep range tight: 10-20g difference max
-5. Final output example: "120-135g" NOT "120-160g"
-
-**EXPLANATION STYLE BY AGE:**
-- **Age < 60:** "This protein level (X-Yg/kg) supports [goal] while remaining achievable with normal meals. Higher end if training regularly."
-- **Age 60-64:** "This moderate protein level supports [goal] while being gentle on digestion and sustainable long-term."
-- **Age 65+:** "This protein level supports muscle maintenance and strength without overwhelming digestion. Quality over quantity at this stage."
-
-**Example (83kg, age 29, weight loss, balanced):**
-Age < 65 → 83 × 1.6 = 133g, 83 × 1.8 = 149g → Round to **130-145g protein**
-
-**Example (60kg, age 68, weight loss, conservative):**
-Age 65+ → 60 × 0.9 = 54g, 60 × 1.1 = 66g → Round to **55-65g protein**
-**Explanation:** "This moderate protein level (0.9-1.1g/kg) supports muscle maintenance during gradual fat loss without overwhelming digestion. Focus on high-quality sources like dal, yogurt, and lean proteins."
-
-**For this user ({profile.weight_kg}kg, {profile.age}y, {profile.goal}, {profile.goal_pace}):** Apply appropriate age-based multiplier range above.
-
----
-
-### 🔸 STEP 5: MEDICAL CONDITIONS & DIETARY ADJUSTMENTS
-
-**User's Medical Conditions:** {profile.medical_manual if profile.medical_manual else "None"}
-
-**CRITICAL: If user has medical conditions, you MUST adapt the diet plan accordingly!**
-
-**Condition-Specific Dietary Adjustments:**
-
-**1. Diabetes/Pre-diabetes/High HbA1c:** Low GI carbs (whole grains, millets, oats, brown rice). High fiber, protein with every meal. AVOID: White rice, maida, refined sugar, juices. LIMIT: Potatoes, white bread. Meal timing: Every 3-4 hours.
-
-**2. Thyroid Issues:** Hypothyroid: Iodine (salt, fish, dairy), Selenium (Brazil nuts, eggs), Zinc. LIMIT raw cruciferous, AVOID excess soy. Hyperthyroid: Calcium-rich, anti-inflammatory. LIMIT iodine, caffeine.
-
-**3. PCOD/PCOS:** Low GI carbs, high fiber, anti-inflammatory. Increase omega-3, protein, cinnamon. AVOID refined carbs, sugar, trans fats. LIMIT dairy, red meat. Manage insulin resistance.
-
-**4. High Cholesterol:** Soluble fiber (oats, barley, apples, beans), omega-3, nuts, olive oil, fatty fish, garlic. AVOID deep-fried, saturated/trans fats, processed meats. LIMIT red meat, full-fat dairy, egg yolks (max 2-3/week).
-
-**5. Hypertension:** DASH principles - fruits, vegetables, whole grains, low-fat dairy. Increase potassium, magnesium, fiber. Include beetroot, garlic. CRITICAL: LOW SODIUM - avoid pickles, papad, packaged snacks. LIMIT salt <5g/day, alcohol, caffeine.
-
-**6. Low Vitamin D:** Fatty fish, egg yolks, fortified milk, sun-exposed mushrooms. 15-20 min sunlight daily (before 10 AM or after 4 PM). Consider supplements if <20 ng/mL.
-
-**7. Low Iron/Anemia:** Iron-rich foods (spinach, beetroot, dates, raisins, jaggery). Non-veg: Chicken liver, red meat (moderation). Include Vitamin C with meals (lemon, amla, tomatoes). AVOID tea/coffee with meals.
-
-**8. High Triglycerides:** Increase omega-3, fiber, whole grains. AVOID refined carbs, sugar, alcohol, juices. LIMIT simple carbs, saturated fats.
-
-**IMPLEMENTATION RULES:**
-1. **Multiple Conditions:** If user has multiple conditions, prioritize adjustments that satisfy ALL conditions
-   - Example: Diabetes + High Cholesterol → Low GI + Low saturated fat foods
-2. **Meal Modifications:** Explicitly modify meal suggestions based on conditions
-   - Example: If diabetic, replace white rice with brown rice/quinoa/millets
-3. **Medical Adjustments Field:** Clearly state what was adjusted in the `medical_adjustments` field
-4. **Safety:** If conditions conflict or are severe (e.g., kidney issues + high protein need), recommend conservative approach
-
-**For this user's conditions:** {profile.medical_manual if profile.medical_manual else "None - proceed with standard recommendations"}
-
-**CRITICAL IMPLEMENTATION CHECKLIST:**
-If user has medical conditions, you MUST:
-✓ Modify EVERY meal in all 7 days based on condition-specific rules above
-✓ Replace problematic ingredients (e.g., white rice → brown rice for diabetes)
-✓ Add condition-appropriate foods (e.g., oats for high cholesterol)
-✓ Avoid trigger foods completely (e.g., no pickles for hypertension)
-✓ Mention adjustments clearly in medical_adjustments field
-✓ Ensure meals are still delicious and culturally appropriate
-
-VERIFICATION: Before finalizing output, ask yourself:
-- Did I check EVERY meal against medical conditions?
-- Did I replace ALL problematic ingredients?
-- Is medical_adjustments field specific and accurate?
-- Would a nutritionist approve this for the user's condition?
-
----
-
-### 🔸 OUTPUT REQUIREMENTS (VERY IMPORTANT)
-
-Your output must be **structured, refined, and complete**, not just a 7-day food list.
-
-#### 1️⃣ Goal Summary (MANDATORY - Include Target Weight Timeline!)
-**CRITICAL:** ALWAYS start with the user's name: "{profile.name}, you're aiming to..."
-
-**You MUST include:**
-- Personalized greeting with user's name
-- Current weight → Target weight (weight change required)
-- Estimated timeline to reach target (in weeks/months based on safe weekly rate)
-- Why this plan supports reaching the target
-- Current body stats and nutritional focus (calorie deficit/surplus, protein optimization, sugar control, etc.)
-- Any medical adjustments made
-
-**Example formats:**
-- "{profile.name}, you're aiming to move from 83kg to 75kg (8kg loss). Based on your age and balanced approach, this can be achieved safely over 12-16 weeks."
-- "{profile.name}, your goal is to reach 65kg from 58kg (7kg gain). With a conservative approach suitable for your age, expect to reach this target in 20-25 weeks."
-- "{profile.name}, targeting 52kg from 45kg (7kg gain). At age 68, we'll take a gentle approach over 24-28 weeks to ensure sustainable, healthy progress."
-
-**DO NOT:**
-- Start without the user's name
-- Skip mentioning current → target weight
-- Provide vague timelines ("eventually", "in time")
-- Give unrealistic timelines (2kg loss in 1 week)
-
-#### 2️⃣ Daily Nutrition Targets (WITH EXPLANATIONS)
-**CRITICAL:** Use EXACT calculated values AND provide COACH-LIKE, CONFIDENCE-BUILDING explanations!
-
-**EXPLANATION TONE GUIDELINES (AGE-SENSITIVE):**
-- Keep explanations SHORT (2-4 lines max)
-- Use encouraging, coach-like language
-- Avoid overly technical jargon
-- Use conditional language ("higher end if training regularly")
-- Emphasize sustainability and adherence over perfection
-- Build trust by showing logic WITHOUT exposing contradictory math
-- **FOR AGE 65+:** Emphasize safety, strength maintenance, energy, and recovery. Use gentle, reassuring language. NEVER use aggressive terms.
-
-**You MUST include:**
-
-**Calories:** Narrow 50-80 kcal range (e.g., "1900-1950 kcal")
-
-**Calories Reasoning (AGE-ADAPTIVE):**
-- **Age < 60:** "Based on your stats and typical daily activity, estimated maintenance is around X-Y kcal. This [pace] approach targets [expected loss/gain rate]."
-- **Age 60-64:** "We've set a sustainable calorie level that supports your goal while maintaining energy. At this stage, gradual progress is optimal for long-term success."
-- **Age 65+:** "At your age, we've calibrated calories to prioritize maintaining strength, energy, and recovery while supporting gradual [goal]. This gentle approach helps with adherence and overall well-being."
-- NEVER state exact TDEE if it creates numerical contradictions
-- Use ranges: "estimated maintenance around X-Y kcal" or "maintenance range of X-Y kcal"
-
-**Protein:** Tight 10-20g range (e.g., "130-145g" or "55-65g")
-
-**Protein Reasoning (AGE-ADAPTIVE):**
-- **Age < 60:** "This protein level (X-Yg/kg) supports [muscle preservation/growth] during your [goal] while remaining achievable with normal meals. Higher end applies if you're training regularly."
-- **Age 60-64:** "This moderate protein level (X-Yg/kg) supports your [goal] while being gentle on digestion and sustainable long-term. Focus on high-quality sources."
-- **Age 65+:** "This protein level (X-Yg/kg) supports muscle maintenance and strength without overwhelming digestion. At this stage, we prioritize quality protein sources over quantity."
-- Mention g/kg range for transparency
-- Emphasize achievability and digestibility for elderly users
-- NEVER use aggressive language like "maximize protein" for 65+
-
-**Other Required Fields:**
-- **Carbs & Fats Guidance:** Brief, goal-appropriate
-- **Medical Adjustments:** **CRITICAL - Be specific about what was changed!**
-  - If NO conditions: "None - standard healthy diet approach"
-  - If conditions exist: List specific modifications made
-  - Example: "Diabetes: Using low GI carbs (brown rice, millets, oats). Avoiding white rice and refined flour. Including protein with every meal to stabilize blood sugar."
-  - Example: "High Cholesterol: Limiting saturated fats, avoiding deep-fried foods. Using olive oil instead of ghee. Including oats and walnuts for heart health."
-  - Example: "PCOD + Diabetes: Combined low GI approach with anti-inflammatory foods. Increased omega-3 and fiber. Limited dairy products."
-- **Adherence Note:** "These targets can be adjusted by ±100 kcal based on your energy levels and how you feel. Consistency matters more than hitting exact numbers daily."
-
-#### 3️⃣ Meal Structure (Dynamic, NOT fixed 4 meals)
-Include meals **only if beneficial**:
-- Early Morning (if needed)
-- Breakfast
-- Mid-Morning Snack (if needed)
-- Lunch
-- Evening Snack
-- Dinner
-- Before Bed (if helpful for goal)
-
-Each meal should include:
-- Food items with portion sizes (e.g., "2 Rotis + 1 cup Dal")
-- Purpose of the meal (energy, protein, recovery, digestion)
-
-#### 4️⃣ 7-Day Plan (Refined, Goal-Based)
-Provide a **7-day plan** with:
-- Variety (not same meals every day)
-- Simple food swaps where possible
-- Practical and realistic Indian meals
-- 80% {profile.region} regional preference, 20% variety
-
-#### 5️⃣ Activity Guidance (CONDITIONAL - Age-Appropriate & Stress-Aware!)
-**CRITICAL:** Adapt to user's age and goal. NO generic "strength + cardio" for everyone!
-
-**For Muscle Gain (Age < 50):**
-- Frequency: 4-5 days/week
-- Type: "Strength training with progressive overload"
-- Tips: "Focus on compound movements, increase weights gradually. Allow 48h recovery between sessions."
-
-**For Muscle Gain (Age 50-64):**
-- Frequency: 3-4 days/week
-- Type: "Moderate strength training with emphasis on form"
-- Tips: "Prioritize movement quality over heavy weights. Include longer warm-ups and recovery periods."
-
-**For Muscle Gain (Age 65+):**
-- Frequency: 2-3 days/week
-- Type: "Light resistance training, bodyweight exercises, resistance bands"
-- Tips: "Focus on maintaining muscle mass and functional strength. Avoid heavy loads. Prioritize balance and mobility."
-
-**For Weight Loss (Age < 50):**
-- Frequency: 5-6 days/week
-- Type: "Cardio (walking/jogging) + light strength training"
-- Tips: "Start with 30-min walks, gradually add intensity. Include 2-3 strength sessions weekly."
-
-**For Weight Loss (Age 50-64):**
-- Frequency: 4-5 days/week
-- Type: "Moderate walking, light cardio, gentle strength work"
-- Tips: "Focus on consistency over intensity. Include rest days for recovery. Listen to your body."
-
-**For Weight Loss (Age 65+):**
-- Frequency: 3-4 days/week
-- Type: "Light walking, chair exercises, gentle stretching"
-- Tips: "Prioritize daily movement over intense sessions. Walking after meals helps digestion and blood sugar. Avoid high-impact activities."
-
-**For Balanced Diet / Maintenance (Age < 60):**
-- Frequency: 3-4 days/week
-- Type: "Walking, yoga, or light exercise"
-- Tips: "Focus on consistency, not intensity. Build sustainable habits."
-
-**For Balanced Diet / Maintenance (Age 60+):**
-- Frequency: 3-4 days/week
-- Type: "Light walking, stretching, balance exercises, yoga"
-- Tips: "Prioritize joint health, flexibility, and balance. Daily gentle movement is better than occasional intense exercise."
-
-**For Diabetes / Medical (Any Age):**
-- Frequency: 5 days/week
-- Type: "30-45 min walking after meals"
-- Tips: "Monitor blood sugar before and after activity. Consistent timing helps blood sugar regulation."
-
-**Current user:** Age {profile.age}, Goal: {profile.goal}
-**→ Choose the appropriate guidance above based on BOTH age AND goal. DO NOT mix categories!**
-
-#### 6️⃣ Expected Results (MANDATORY - Target Weight Focused!)
-**CRITICAL:** All results must be tied to reaching the TARGET WEIGHT of {profile.target_weight_kg}kg.
-
-**User's Target:**
-- Current: {profile.weight_kg}kg
-- Target: {profile.target_weight_kg}kg
-- Change needed: {abs(profile.target_weight_kg - profile.weight_kg):.1f}kg {"loss" if profile.target_weight_kg < profile.weight_kg else "gain"}
-- Age: {profile.age}
-- Pace: {profile.goal_pace}
-
-**Calculate weight change (AGE-SENSITIVE & TARGET-ALIGNED):**
-- Calorie deficit of 500/day = ~0.5kg/week (younger adults)
-- Calorie deficit of 300-400/day = ~0.3-0.4kg/week (60-64 age group)
-- Calorie deficit of 200-300/day = ~0.2-0.3kg/week (65+ age group)
-- Surplus of 300-500/day = 0.25-0.5kg muscle gain/month
-
-**You MUST calculate:**
-1. Weekly weight change rate (based on calorie deficit/surplus)
-2. Estimated weeks to reach target = weight_change / weekly_rate
-3. When they'll reach their target weight
-4. Reassessment points along the journey
-
-**If weight loss:**
-- **Age < 60:** Calculate expected kg/week from actual calorie deficit
-- **Age 60-64:** Expect slower but sustainable progress (~0.3-0.4kg/week max)
-- **Age 65+:** Expect gentle progress (~0.2-0.3kg/week). Emphasize "This gradual pace prioritizes muscle preservation and energy levels."
-
-**If muscle gain:**
-- **Age < 60:** "0.25-0.5kg gain per month" (realistic muscle)
-- **Age 60+:** "0.2-0.3kg gain per month with strength training" (slower but sustainable)
-
-**If balanced diet:** "Maintenance - no significant weight change. Focus on energy, strength, and overall health."
-
-**Visible changes (AGE-ADAPTED):**
-- **Age < 40:** "Visible changes in 3-4 weeks"
-- **Age 40-60:** "Visible changes in 4-6 weeks"
-- **Age 60-64:** "Visible changes in 5-7 weeks"
-- **Age 65+:** "Visible changes in 6-8 weeks. Progress may be gradual but sustainable."
-
-**Milestones (CALCULATED, NOT GENERIC):**
-- **30-day milestone:** Calculate based on weekly change × 4 weeks
-- **60-day milestone:** Calculate based on weekly change × 8 weeks
-- **90-day milestone:** Calculate based on weekly change × 12 weeks
-- Example for younger adult: 0.5kg/week × 4 = 2kg in 30 days
-- Example for 65+: 0.25kg/week × 4 = 1kg in 30 days
-
-**Plateau Warning (AGE-SENSITIVE):**
-- **Age < 60:** "Progress may slow after 8-12 weeks. Adjust calories by 100-150 kcal if needed."
-- **Age 60+:** "If progress stalls, focus on strength, energy, and overall health rather than aggressive adjustments."
-
-#### 7️⃣ Important Notes & Safety
-Include:
-- Hydration guidance (liters per day)
-- Sleep importance
-- Medical disclaimer if conditions exist
-- When to reassess calories/plan
-
----
-
-### 🔸 DIET STRICTNESS RULES
-- **Vegetarian:** No meat, fish, eggs
-- **Non-Veg:** Include meat/fish options
-- **Jain:** No onion, garlic, root vegetables
-- **Eggetarian:** Vegetarian + eggs allowed
-
----
-
-### 🔸 REGIONAL BALANCE (80/20 Rule)
-- **South Indian:** 80% Rice/Idli/Dosa, 20% Roti (dinner)
-- **North Indian:** 80% Roti/Paratha, 20% Idli/Dosa (breakfast)
-- **West/East Indian:** Balanced mix with regional staples
-
----
-
-### 🔸 TONE & STYLE
-- Simple, clear, and human
-- Encouraging and coach-like
-- No extreme or unsafe advice
-- Think like a **nutrition coach**, not a recipe generator
-
----
-
-### 🔸 CALCULATION EXAMPLES (Reference Only)
-
-**Example 1 (68F, 60kg, 160cm, Maintenance):** BMR=1139 → TDEE=1367 (1.2×) → Calories: **1350-1400 kcal**, Protein: **55-65g** (0.9-1.1g/kg, age 60+)
-
-**Example 2 (25M, 75kg, 175cm, Muscle Gain, Balanced):** BMR=1719 → TDEE=2321 (midpoint) → Surplus +350 → Calories: **2650-2700 kcal**, Protein: **128-143g** (1.7-1.9g/kg)
-
-**Example 3 (40F, 70kg, 165cm, Weight Loss, Balanced):** BMR=1370 → TDEE=1850 (midpoint) → Deficit 22.5% → Calories: **1400-1450 kcal**, Protein: **85-100g** (1.2-1.4g/kg)
-
-**VALIDATION:** BMR correct? TDEE conservative (1.3-1.4× or 1.2 for 60+)? Deficit/surplus matches goal_pace? Calories 50-80 kcal range? Protein 10-20g range, sustainable multipliers? Reasoning coach-like? Medical adjustments specific? No contradictions?
-
-**→ NOW Calculate for {profile.name}: {profile.age}y, {profile.gender}, {profile.weight_kg}kg, {profile.height_cm}cm, {profile.goal}, {profile.goal_pace}**
-
----
-
-### 🔸 REQUIRED JSON OUTPUT FORMAT
-
-**CRITICAL:** Replace ALL template values with CALCULATED values!
-
-{{
-  "summary": "MUST start with personalized greeting: '{profile.name}, you're aiming to...' Then include: Current weight → Target weight. Estimated timeline (X weeks/months). Why plan supports this. Stats. Adjustments. Example: 'John, you're aiming to move from 83kg to 75kg (8kg loss). Based on your age and balanced approach, this can be achieved safely over 12-16 weeks. This plan uses a calibrated calorie deficit with optimized protein to preserve muscle while burning fat.'",
-  "target_weight_goal": {{
-    "current_weight": {profile.weight_kg},
-    "target_weight": {profile.target_weight_kg},
-    "weight_change_needed": "[CALCULATED: target - current, with +/- sign]",
-    "estimated_weeks": "[CALCULATED: Based on safe weekly rate for age and pace]",
-    "estimated_timeline": "[Human readable: '12-16 weeks' or '4-5 months']",
-    "target_bmi": "[CALCULATED: BMI at target weight]",
-    "safety_note": "[If timeline >6 months or age 65+, add reassuring note about sustainable approach]"
-  }},
-  "daily_targets": {{
-    "calories": "[CALCULATED narrow 50-80 kcal range, e.g., 1900-1950 kcal]",
-    "calories_reasoning": "[MANDATORY: Coach-like explanation, 2-4 lines. Choose GOOD examples from guidelines above. AVOID stating exact TDEE if it creates math contradictions. Example: 'Based on your age, stats, and typical activity, your estimated maintenance is around 2400-2550 kcal. For balanced weight loss, we've designed a calibrated deficit to support steady fat loss of 0.5-0.75kg per week.']",
-    "protein": "[CALCULATED tight 10-20g range using SUSTAINABLE multipliers, e.g., 130-150g]",
-    "protein_reasoning": "[MANDATORY: Coach-like, 2-3 lines. Use GOOD examples from guidelines. AVOID athlete-level justifications. Example: 'This protein level (1.2-1.4g per kg) supports muscle preservation during your deficit while staying achievable with normal meals. Higher end if you're training regularly.']",
-    "carbs_guidance": "[Adapt based on medical conditions. Example: 'Moderate whole grains' OR 'Low GI carbs (brown rice, oats, millets)' if diabetic]",
-    "fats_guidance": "[Adapt based on medical conditions. Example: 'Healthy fats from nuts, olive oil' OR 'Limited saturated fats, focus on omega-3' if high cholesterol]",
-    "medical_adjustments": "[CRITICAL: If conditions exist, be specific! Example: 'Diabetes: Using low GI carbs, avoiding refined flour and white rice. Including protein with every meal.' OR 'None - standard healthy approach' if no conditions]",
-    "adherence_note": "These targets can be adjusted by ±100 kcal based on your energy levels and how you feel. Consistency matters more than hitting exact numbers daily."
-  }},
-  "days": [
-    {{
-      "day": 1,
-      "early_morning": "[Include ONLY if beneficial for goal]",
-      "breakfast": "Specific dish with portions",
-      "mid_morning": "[Include ONLY if needed]",
-      "lunch": "Specific dish with portions",
-      "evening_snack": "Specific dish",
-      "dinner": "Specific dish with portions",
-      "before_bed": "[Include ONLY if helpful]"
-    }},
-    ...continue for 7 days with variety
-  ],
-  "activity_guidance": {{
-    "training_frequency": "[CHOOSE from age-goal matrix above]",
-    "type": "[SPECIFIC to user's age and goal]",
-    "beginner_tips": "[RELEVANT to chosen activity type]"
-  }},
-  "expected_results": {{
-    "weekly_weight_change": "[CALCULATED from calorie deficit/surplus, e.g., '0.5-0.75kg per week']",
-    "target_achievement": "[When will they reach target weight? e.g., 'Expected to reach 75kg target in 12-16 weeks']",
-    "visible_changes": "[ADAPT to user's age from guidelines]",
-    "30_day_milestone": "[CALCULATED: weekly_change × 4, e.g., '2-3kg lighter, approximately 80-81kg']",
-    "60_day_milestone": "[CALCULATED: weekly_change × 8, e.g., '4-6kg lighter, approximately 77-79kg']",
-    "90_day_milestone": "[CALCULATED: weekly_change × 12, e.g., '6-9kg lighter, close to or at 75kg target']",
-    "reassessment_note": "[When to adjust plan based on progress toward target]",
-    "plateau_warning": "[Relevant warning or 'N/A' if maintenance]"
-  }},
-  "important_notes": {{
-    "hydration": "[Adapt to user's weight: ~0.03L per kg bodyweight]",
-    "sleep": "Aim for 7-8 hours of quality sleep",
-    "medical_disclaimer": "[ONLY if user has medical conditions, else generic]",
-    "reassessment": "Reassess plan every 4 weeks based on progress"
-  }}
-}}
-"""
-
-    # Optimized user prompt - concise but complete
-    user_prompt = f"""Generate diet plan for {profile.name} ({profile.age}y, {profile.gender}, {profile.weight_kg}kg, {profile.height_cm}cm).
-Goal: {profile.goal} ({profile.goal_pace} pace)
-Diet: {profile.diet_pref}, Region: {profile.region}
-Medical: {', '.join(profile.medical_manual) if profile.medical_manual else 'None'}
-Output complete 7-day plan with calculated nutrition targets."""
-
-    try:
-        start_time = time.time()
-        logger.info(f"Generating {profile.goal} plan for {profile.name}")
-        # Use higher max_tokens for diet plan (needs complete 7-day plan with all details)
-        diet_plan_json = call_ai_json(system_prompt, user_prompt, max_tokens=4000)
-        elapsed = time.time() - start_time
-        logger.info(f"Diet plan generation completed in {elapsed:.2f}s")
-
-        # Check for AI errors
-        if "error" in diet_plan_json:
-            logger.error(f"AI generation failed: {diet_plan_json}")
-            raise HTTPException(status_code=500, detail="Failed to generate diet plan")
-
-        # 3. SAVE PLAN
-        db_plan = DietPlan(
-            user_id=db_user.id,
-            plan_json=json.dumps(diet_plan_json),
-            title=f"{profile.goal} - {profile.region} Plan"
-        )
-        db.add(db_plan)
-        db.commit()
-        db.refresh(db_plan)
-
-        logger.info(f"Plan created successfully: {db_plan.id}")
-
-        return {
-            "user_id": db_user.id,
-            "plan_id": db_plan.id,
-            "diet": diet_plan_json
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error generating plan: {e}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to generate and save plan")
-@app.post("/generate-grocery/{plan_id}")
-async def generate_grocery(plan_id: int, db: Session = Depends(get_db)):
-    """
-    Retrieves a diet plan and converts it into a consolidated grocery list with:
-    - Price estimates and budget analysis
-    - Seasonal availability warnings
-    - Smart swap suggestions
-    - Multi-store price comparison
-    - Bulk buying optimization
-    - Expiry date warnings
-    - Shopping route optimization
-    """
-    # 1. Fetch Plan
-    plan = db.query(DietPlan).filter(DietPlan.id == plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Plan not found")
-
-    # 2. Get current month and week for seasonal/trend analysis
-    current_month = datetime.now().strftime("%B")
-    current_week = datetime.now().isocalendar()[1]
-
-    # 3. SMART DYNAMIC Grocery Intelligence - Analyze diet plan specifics
-    system_prompt = """
-You are a grocery list generation AI for Indian households. Generate a SMART, BUDGET-CONSCIOUS shopping list from the meal plan.
-
-CRITICAL: Output MUST be valid JSON. Keep all text simple with no special chars.
-
-TASK: Analyze the 7-day meal plan and:
-1. Extract ALL unique ingredients mentioned
-2. Calculate REALISTIC weekly quantities based on actual meals (not generic estimates)
-3. Price items based on Indian market rates and actual quantities needed
-4. Identify budget optimization opportunities
-
-PRICING GUIDELINES (Indian Market Rates - Adjust based on calculated quantities):
-
-VEGETABLES & FRUITS:
-- Leafy Greens (Spinach, Methi, etc.): Rs 20-30 per bunch/250g
-- Common Veggies (Tomato, Onion, Potato, Capsicum): Rs 30-60 per kg
-- Premium Veggies (Broccoli, Zucchini, Mushroom): Rs 80-150 per kg
-- Seasonal Fruits (Banana, Apple, Papaya): Rs 40-80 per kg
-- Premium Fruits (Berries, Avocado, Pomegranate): Rs 150-300 per kg
-
-DAIRY & PROTEINS:
-- Milk (1L): Rs 55-70
-- Paneer (200-250g): Rs 80-100
-- Curd/Yogurt (500g): Rs 40-60
-- Eggs (1 dozen): Rs 70-90
-- Chicken (1kg): Rs 180-220
-- Fish (1kg): Rs 250-400 (varies by type)
-- Tofu (200g): Rs 50-70
-
-GRAINS & PULSES:
-- Rice (1kg): Rs 50-80 (normal), Rs 100-150 (basmati)
-- Wheat Flour/Atta (1kg): Rs 40-50
-- Oats (500g): Rs 120-160
-- Dal/Lentils (1kg): Rs 100-150
-- Quinoa (500g): Rs 250-350
-
-SPICES, OILS & CONDIMENTS:
-- Cooking Oil (1L): Rs 150-200
-- Ghee (500g): Rs 300-400
-- Basic Spices (100g each): Rs 30-50
-- Premium Spices (Saffron, Cardamom): Rs 100-500
-
-OTHER:
-- Nuts (100g): Rs 100-200
-- Dry Fruits (100g): Rs 150-300
-- Bread (1 loaf): Rs 40-50
-- Protein Powder (1kg): Rs 1500-3000
-
-SMART CALCULATION LOGIC:
-1. Parse each meal and extract ingredients with context
-2. Estimate realistic weekly quantities:
-   - If "2 Rotis" appears 7 times → ~1.5kg atta needed
-   - If "1 cup Dal" appears 5 times → ~500g dal needed
-   - If "Paneer Sabzi" appears 2 times → ~300g paneer needed
-3. Calculate prices: quantity × unit_price
-4. Sum ALL individual item prices for total
-5. Budget level: "low" if total < 800, "moderate" if 800-1500, "high" if > 1500
-6. Find savings: suggest cheaper alternatives for expensive items
-
-EXAMPLE ANALYSIS:
-Meal: "2 Rotis + 1 cup Dal + Sabzi (Aloo Gobi)"
-→ Extract: Wheat flour (for rotis), Dal, Potato, Cauliflower, Spices
-→ Weekly quantity: If this meal repeats 3 times, you need portions accordingly
-
-OUTPUT FORMAT (JSON):
-{
-  "categories": [
-    {"name": "Vegetables", "items": [
-      {"name": "Tomato", "quantity": "2kg", "display": "2kg Tomato", "estimated_price": 100, "price_range": "Rs 90-120", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Day 1 Lunch", "Day 3 Dinner", "Day 5 Lunch"]}
-    ]},
-    {"name": "Dairy and Proteins", "items": [
-      {"name": "Milk", "quantity": "7L", "display": "7L Milk", "estimated_price": 420, "price_range": "Rs 385-490", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Daily breakfast"]}
-    ]},
-    {"name": "Grains and Pulses", "items": [
-      {"name": "Wheat Flour", "quantity": "2kg", "display": "2kg Atta", "estimated_price": 90, "price_range": "Rs 80-100", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["Rotis - Multiple days"]}
-    ]},
-    {"name": "Spices and Oils", "items": [
-      {"name": "Cooking Oil", "quantity": "1L", "display": "1L Oil", "estimated_price": 180, "price_range": "Rs 150-200", "seasonal_status": "available", "seasonal_warning": null, "alternative": null, "used_in_meals": ["All cooking"]}
-    ]}
-  ],
-  "budget_analysis": {
-    "total_estimated": [MUST CALCULATE: exact sum of ALL item estimated_price values],
-    "breakdown": {
-      "vegetables": [CALCULATE: sum of vegetable category items],
-      "dairy_proteins": [CALCULATE: sum of dairy and protein items],
-      "grains_pulses": [CALCULATE: sum of grains and pulses],
-      "spices": [CALCULATE: sum of spices/oils],
-      "other": [CALCULATE: sum of other items]
-    },
-    "budget_level": "[CALCULATE: low if total < 800, moderate if 800-1500, high if > 1500]",
-    "savings_potential": [CALCULATE: realistic savings amount if cheaper swaps exist, 0 otherwise],
-    "smart_swaps": [{"original": "Basmati Rice", "alternative": "Regular Rice", "savings": 60, "reason": "Similar nutrition lower cost"}]
-  },
-  "seasonal_summary": {"out_of_season_count": 0, "warnings": [], "message": "All items in season"},
-  "shopping_tips": ["Buy vegetables from local market for 20 percent savings", "Buy staples in bulk for 15 percent discount"]
-}
-
-CRITICAL RULES:
-- Analyze ACTUAL meals in the plan, don't use generic templates
-- Calculate quantities based on REAL consumption (e.g., if "2 Rotis" appear 14 times across week, estimate atta needed)
-- Price each item realistically based on quantity
-- Total MUST be exact sum of all items
-- Keep text simple, no special characters
-- Use null not empty string
-- Smart swaps should be practical and culturally appropriate
-"""
-
-    # Optimize: Extract only meal data, not full plan structure
-    try:
-        plan_data = json.loads(plan.plan_json) if isinstance(plan.plan_json, str) else plan.plan_json
-        # Extract only days array for grocery generation (most relevant)
-        days_data = plan_data.get('days', [])
-        meals_summary = json.dumps(days_data, ensure_ascii=False)[:2500]  # Increased but still limited
-    except:
-        meals_summary = plan.plan_json[:2000] if isinstance(plan.plan_json, str) else str(plan.plan_json)[:2000]
-    
-    user_prompt = f"Meal plan (7 days): {meals_summary}"
+    # 2. Optimize: Extract only meal data, not full plan structure
+    try:
+        plan_data = load_json_column(plan.plan_json)
+        # Extract only days array for grocery generation (most relevant)
+        days_data = plan_data.get('days', [])
+        meals_summary = orjson.dumps(days_data).decode()[:2500]  # Increased but still limited
+    except:
+        meals_summary = plan.plan_json[:2000] if isinstance(plan.plan_json, str) else orjson.dumps(plan.plan_json).decode()[:2000]
+    
+    user_prompt = f"Meal plan (7 days): {meals_summary}"
 
     try:
         start_time = time.time()
-        logger.info(f"Generating enhanced grocery list for plan {plan_id}")
+        logger.info("Generating enhanced grocery list for plan %s", plan_id)
         # Grocery list needs fewer tokens (simpler structure)
-        grocery_data = call_ai_json(system_prompt, user_prompt, max_tokens=3000)
+        grocery_data = await call_ai_json(GROCERY_SYSTEM_PROMPT, user_prompt, max_tokens=3000, temperature=0)  # Deterministic totals for a given plan
         elapsed = time.time() - start_time
-        logger.info(f"Grocery list generation completed in {elapsed:.2f}s")
+        logger.info("Grocery list generation completed in %.2fs", elapsed)
 
         # Validate response structure
         if "error" in grocery_data:
-            logger.error(f"AI grocery generation failed: {grocery_data}")
+            logger.error("AI grocery generation failed: %s", grocery_data)
             raise HTTPException(status_code=500, detail="Failed to generate grocery list")
 
-        # 4. POST-PROCESSING: Calculate totals dynamically from items
+        # 3. POST-PROCESSING: Price staples from the rate table, then calculate totals dynamically from items
         # This ensures the total is always correct even if AI doesn't calculate it properly
         categories = grocery_data.get("categories", [])
         total_calculated = 0
@@ -2104,22 +2220,15 @@ CRITICAL RULES:
             
             category_total = 0
             for item in items:
+                if isinstance(item, dict):
+                    price_grocery_item(item)
                 item_price = item.get("estimated_price", 0)
                 if isinstance(item_price, (int, float)) and item_price > 0:
                     category_total += item_price
                     total_calculated += item_price
             
             # Map category to breakdown
-            if "vegetable" in category_name:
-                breakdown_calculated["vegetables"] += category_total
-            elif any(keyword in category_name for keyword in ["dairy", "protein", "meat", "chicken", "fish", "egg", "paneer", "milk", "yogurt", "curd"]):
-                breakdown_calculated["dairy_proteins"] += category_total
-            elif any(keyword in category_name for keyword in ["grain", "pulse", "dal", "rice", "wheat", "atta", "flour"]):
-                breakdown_calculated["grains_pulses"] += category_total
-            elif any(keyword in category_name for keyword in ["spice", "oil", "masala"]):
-                breakdown_calculated["spices"] += category_total
-            else:
-                breakdown_calculated["other"] += category_total
+            breakdown_calculated[grocery_bucket(category_name)] += category_total
 
         # Update budget_analysis with calculated values
         if "budget_analysis" not in grocery_data:
@@ -2140,24 +2249,23 @@ CRITICAL RULES:
             else:
                 grocery_data["budget_analysis"]["budget_level"] = "high"
             
-            logger.info(f"Recalculated totals: Total=₹{total_calculated}, Breakdown={breakdown_calculated}")
+            logger.info("Recalculated totals: Total=₹%s, Breakdown=%s", total_calculated, breakdown_calculated)
 
-        # 5. Save Update
-        plan.grocery_json = json.dumps(grocery_data)
-        db.commit()
+        # 4. Save Update (sync SQLAlchemy - run in a worker thread)
+        await asyncio.to_thread(save_grocery_list, db, plan_id, grocery_data)
 
         final_total = grocery_data.get("budget_analysis", {}).get("total_estimated", 0)
-        logger.info(f"Enhanced grocery list generated successfully. Total: ₹{final_total}")
+        logger.info("Enhanced grocery list generated successfully. Total: ₹%s", final_total)
         return grocery_data
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error generating grocery list: {e}")
+        logger.error("Error generating grocery list: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate grocery list")
 
 @app.post("/checkout")
-async def create_razorpay_order(request: OrderRequest):
+def create_razorpay_order(request: OrderRequest):
     """
     Creates an order on Razorpay for payment processing.
     """
@@ -2166,7 +2274,7 @@ async def create_razorpay_order(request: OrderRequest):
         return {"id": "order_test_12345", "amount": request.amount, "currency": "INR", "status": "created (mock)"}
 
     try:
-        client_rzp = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_SECRET))
+        client_rzp = get_razorpay_client()
         data = {
             "amount": request.amount,
             "currency": request.currency,
@@ -2178,7 +2286,7 @@ async def create_razorpay_order(request: OrderRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 @app.post("/save-plan")
-async def save_plan_phone(req: SavePlanRequest, authorization: str = Header(None), db: Session = Depends(get_db)):
+def save_plan_phone(req: SavePlanRequest, authorization: str = Header(None), db: Session = Depends(get_db)):
     # Security: If user is authenticated, verify they can only save to their own phone
     if authorization and authorization.startswith("Bearer "):
         token = authorization.replace("Bearer ", "")
@@ -2200,7 +2308,10 @@ async def save_plan_phone(req: SavePlanRequest, authorization: str = Header(None
         raise HTTPException(status_code=404, detail="User session not found.")
 
     # 2. Find the plan that needs saving (associated with temporary user)
-    latest_plan = db.query(DietPlan).filter(DietPlan.user_id == current_user.id).order_by(DietPlan.created_at.desc()).first()
+    if req.plan_id is not None:
+        latest_plan = db.query(DietPlan).filter(DietPlan.id == req.plan_id, DietPlan.user_id == current_user.id).first()
+    else:
+        latest_plan = db.query(DietPlan).filter(DietPlan.user_id == current_user.id).order_by(DietPlan.created_at.desc()).first()
     if not latest_plan:
         raise HTTPException(status_code=404, detail="No plan found to save.")
 
@@ -2233,19 +2344,26 @@ async def save_plan_phone(req: SavePlanRequest, authorization: str = Header(None
 
     # 4. Update the Plan Title
     latest_plan.title = req.title
+    plan_id, user_id = latest_plan.id, latest_plan.user_id  # Read before commit expires them
     db.commit()
     
-    return {"message": "Plan saved successfully!"}
+    return {"message": "Plan saved successfully!", "plan_id": plan_id, "user_id": user_id}
 
 @app.post("/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.phone == request.phone).first()
-    
-    if not user:
+def login(request: LoginRequest, db: Session = Depends(get_db)):
+    # User + ALL their plans (not just one) in one round-trip - Core select, rows serialize without ORM overhead.
+    # Outer join so a user without plans still comes back (as one row with NULL plan columns)
+    rows = db.execute(
+        select(User.id, User.name, User.phone,
+               DietPlan.id.label("plan_id"), DietPlan.title, DietPlan.created_at, DietPlan.plan_json)
+        .outerjoin(DietPlan, DietPlan.user_id == User.id)
+        .where(User.phone == request.phone)
+        .order_by(DietPlan.created_at.desc())
+    ).all()
+
+    if not rows:
         raise HTTPException(status_code=404, detail="User not found. Please create a plan first.")
-
-    # FETCH ALL PLANS (Not just one)
-    plans = db.query(DietPlan).filter(DietPlan.user_id == user.id).order_by(DietPlan.created_at.desc()).all()
+    user = rows[0]
 
     return {
         "message": "Login successful",
@@ -2256,11 +2374,11 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
         },
         "plans": [
             {
-                "id": p.id,
+                "id": p.plan_id,
                 "title": p.title,
                 "created_at": p.created_at,
-                "diet": json.loads(p.plan_json)
-            } for p in plans
+                "diet": load_json_column(p.plan_json)
+            } for p in rows if p.plan_id is not None
         ]
     }
 
@@ -2270,73 +2388,52 @@ class SwapMealRequest(BaseModel):
     meal_type: str  # breakfast, lunch, dinner, snack
     user_profile: dict  # {diet_pref, region, goal, medical_manual, age, gender, weight_kg}
 
-@app.post("/swap-meal")
-async def swap_meal(request: SwapMealRequest):
-    """
-    Generate smart meal alternatives based on user's profile and dietary preferences.
-    Returns macro-matched, contextually relevant substitutions.
-    """
-    try:
-        # Build context-aware prompt for AI
-        swap_prompt = f"""You are a nutrition substitution engine. Generate 3 smart meal alternatives.
+# Bump when the swap prompt changes so cached answers from the old prompt are not reused
+SWAP_PROMPT_VERSION = 2
+SWAP_PROFILE_FIELDS = ('diet_pref', 'region', 'goal', 'age', 'gender', 'medical_manual')
 
-**Original Meal:** {request.meal_text}
+async def generate_swap_alternatives(request: SwapMealRequest) -> dict:
+    """Build the swap prompt for this meal/profile and return the AI's parsed JSON"""
+    # Only the meal and profile facts vary; rules + output format are in SWAP_MEAL_SYSTEM_PROMPT
+    swap_prompt = f"""**Original Meal:** {request.meal_text}
 **Meal Type:** {request.meal_type}
 **User Profile:**
 - Diet Preference: {request.user_profile.get('diet_pref', 'vegetarian')}
 - Region: {request.user_profile.get('region', 'North Indian')}
 - Goal: {request.user_profile.get('goal', 'balanced diet')}
 - Age: {request.user_profile.get('age', 30)}, Gender: {request.user_profile.get('gender', 'male')}
-- Medical: {request.user_profile.get('medical_manual', 'None')}
+- Medical: {request.user_profile.get('medical_manual', 'None')}"""
 
-**Rules:**
-1. Match macros (protein/carbs/fats) as closely as possible
-2. Respect diet preference (veg/non-veg/vegan)
-3. Use {request.user_profile.get('region', 'North Indian')} regional ingredients primarily
-4. Consider goal: {request.user_profile.get('goal', 'balanced diet')}
-5. If medical conditions exist, avoid trigger foods
+    # Call OpenAI API
+    response = await ai_json_completion(
+        messages=[
+            {"role": "system", "content": SWAP_MEAL_SYSTEM_PROMPT},
+            {"role": "user", "content": swap_prompt}
+        ],
+        temperature=0.2  # Answers are cached and shared across users - keep them stable
+    )
 
-**Output Format (JSON):**
-{{
-  "alternatives": [
-    {{
-      "name": "Alternative 1 Name",
-      "description": "2 items + 1 item",
-      "macro_match": "Similar protein (25g), Lower carbs",
-      "why": "Better for weight loss goal",
-      "diet_tag": "vegetarian"
-    }},
-    {{
-      "name": "Alternative 2 Name",
-      "description": "Detailed meal description",
-      "macro_match": "Higher protein (30g)",
-      "why": "Good for muscle recovery",
-      "diet_tag": "non-vegetarian"
-    }},
-    {{
-      "name": "Alternative 3 Name",
-      "description": "Another option",
-      "macro_match": "Same calories, more fiber",
-      "why": "Easier to prepare",
-      "diet_tag": "vegan"
-    }}
-  ]
-}}
+    return orjson.loads(response.choices[0].message.content)
 
-Provide ONLY the JSON, no other text."""
-
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a nutrition substitution expert. Output ONLY valid JSON."},
-                {"role": "user", "content": swap_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-
-        swap_data = json.loads(response.choices[0].message.content)
+@app.post("/swap-meal")
+async def swap_meal(request: SwapMealRequest):
+    """
+    Generate smart meal alternatives based on user's profile and dietary preferences.
+    Returns macro-matched, contextually relevant substitutions.
+    """
+    try:
+        # Same meal + same prompt-relevant profile fields seen today? Skip the prompt and the AI call
+        profile_fields = {k: request.user_profile.get(k) for k in SWAP_PROFILE_FIELDS}
+        cache_key = hashlib.sha256(orjson.dumps(
+            [SWAP_PROMPT_VERSION, "gpt-4o-mini", request.meal_text, request.meal_type, profile_fields],
+            option=orjson.OPT_SORT_KEYS
+        )).hexdigest()
+        swap_data = swap_meal_cache.get(cache_key)
+        if swap_data is not None:
+            logger.info("Meal swap cache hit: %s", request.meal_text)
+        else:
+            swap_data = await singleflight(swap_meal_inflight, cache_key, lambda: generate_swap_alternatives(request))
+            swap_meal_cache[cache_key] = swap_data
 
         # Filter alternatives based on diet preference
         diet_pref = request.user_profile.get('diet_pref', '').lower()
@@ -2369,7 +2466,7 @@ Provide ONLY the JSON, no other text."""
         }
 
     except Exception as e:
-        logger.error(f"Meal swap error: {e}")
+        logger.error("Meal swap error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to generate alternatives: {str(e)}")
 
 # --- RECIPE VIDEO ENDPOINT ---
@@ -2377,6 +2474,144 @@ class RecipeVideoRequest(BaseModel):
     meal_name: str  # e.g., "Palak Paneer", "Oats with Banana"
     language: Optional[str] = "any"  # "hindi", "english", "any"
 
+MEAL_TOKEN_RE = re.compile(r"\w+")  # Unicode-aware, so Hindi meal names tokenize too
+
+def normalize_meal_query(meal_name: str) -> str:
+    """Cache key for a meal search: lowercase word tokens, punctuation dropped, order-independent"""
+    return " ".join(sorted(MEAL_TOKEN_RE.findall(meal_name.lower())))
+
+# Video ids don't go stale quickly; re-search monthly so better uploads get picked up
+RECIPE_VIDEO_DB_TTL = timedelta(days=30)
+
+def load_recipe_video(cache_key: str) -> Optional[dict]:
+    """Stored YouTube result for this key if it's fresher than RECIPE_VIDEO_DB_TTL (own session)"""
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(RecipeVideo.video_json).where(
+                RecipeVideo.cache_key == cache_key,
+                RecipeVideo.created_at > datetime.utcnow() - RECIPE_VIDEO_DB_TTL
+            )
+        ).first()
+        return row.video_json if row else None
+    finally:
+        db.close()
+
+def store_recipe_video(cache_key: str, result: dict):
+    """Insert or refresh the stored YouTube result for this key (own session)"""
+    insert = pg_insert if IS_POSTGRES else sqlite_insert
+    stmt = insert(RecipeVideo).values(cache_key=cache_key, video_json=result, created_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RecipeVideo.cache_key],
+        set_={"video_json": stmt.excluded.video_json, "created_at": stmt.excluded.created_at}
+    )
+    db = SessionLocal()
+    try:
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+async def fetch_recipe_video(request: RecipeVideoRequest, cache_key: str):
+    """YouTube search for one meal; caches the result on success (fallbacks aren't cached)"""
+    # Second tier: a result stored by another worker or before the last restart
+    try:
+        stored = await asyncio.to_thread(load_recipe_video, cache_key)
+    except Exception as e:
+        logger.warning("Recipe video store read failed: %s", e)
+        stored = None
+    if stored is not None:
+        logger.info("Stored recipe video hit for: %s", request.meal_name)
+        recipe_video_cache[cache_key] = stored
+        return stored
+
+    logger.info("Fetching YouTube video for: %s (language: %s)", request.meal_name, request.language)
+
+    # Build search query
+    language_hint = ""
+    if request.language == "hindi":
+        language_hint = " hindi"
+    elif request.language == "english":
+        language_hint = " english"
+
+    search_query = f"{request.meal_name} recipe easy indian{language_hint}"
+
+    # Call YouTube Data API
+    youtube_url = "https://www.googleapis.com/youtube/v3/search"
+    params = {
+        "part": "snippet",
+        "q": search_query,
+        "type": "video",
+        "videoDuration": "medium",  # 4-20 minutes
+        "maxResults": 1,  # only the top result is used
+        "key": YOUTUBE_API_KEY,
+        "relevanceLanguage": "hi" if request.language == "hindi" else "en",
+        "order": "relevance",
+        # Partial response: only the fields read below come back over the wire
+        "fields": "items(id/videoId,snippet(title,channelTitle,thumbnails/high/url))"
+    }
+
+    response = await api_http_client.get(youtube_url, params=params)
+
+    if response.status_code != 200:
+        error_data = orjson.loads(response.content) if response.content else {}
+        error_message = error_data.get("error", {}).get("message", "Unknown error")
+        logger.error("YouTube API error: %s - %s", response.status_code, error_message)
+        
+        # If API key is invalid or missing, return fallback
+        if response.status_code == 403 or "API key" in error_message:
+            logger.warning("YouTube API key invalid or quota exceeded, using fallback")
+            search_query = f"{request.meal_name} recipe easy indian"
+            return {
+                "success": True,
+                "video_id": None,
+                "title": f"Search: {request.meal_name} Recipe",
+                "channel": "YouTube",
+                "thumbnail": "https://via.placeholder.com/480x360?text=API+Key+Issue",
+                "url": f"https://www.youtube.com/results?search_query={search_query.replace(' ', '+')}",
+                "fallback": True
+            }
+        
+        raise HTTPException(status_code=500, detail=f"YouTube API request failed: {error_message}")
+
+    data = orjson.loads(response.content)
+
+    if not data.get("items"):
+        logger.info("No videos found for: %s", request.meal_name)
+        return {
+            "success": False,
+            "message": "No recipe videos found",
+            "fallback": True,
+            "url": f"https://www.youtube.com/results?search_query={search_query.replace(' ', '+')}"
+        }
+
+    # Get first video
+    video = data["items"][0]
+    video_id = video["id"]["videoId"]
+    snippet = video["snippet"]
+
+    result = {
+        "success": True,
+        "video_id": video_id,
+        "title": snippet["title"],
+        "channel": snippet["channelTitle"],
+        "thumbnail": snippet["thumbnails"]["high"]["url"],
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "embed_url": f"https://www.youtube.com/embed/{video_id}",
+        "fallback": False
+    }
+
+    # Cache the result (memory + store; a failed store write only costs a future YouTube call)
+    recipe_video_cache[cache_key] = result
+    try:
+        await asyncio.to_thread(store_recipe_video, cache_key, result)
+    except Exception as e:
+        logger.warning("Recipe video store write failed: %s", e)
+    
+    logger.info("Successfully fetched YouTube video: %s (ID: %s)", result['title'], video_id)
+
+    return result
+
 @app.post("/get-recipe-video")
 async def get_recipe_video(request: RecipeVideoRequest):
     """
@@ -2384,10 +2619,10 @@ async def get_recipe_video(request: RecipeVideoRequest):
     Uses caching to avoid repeated API calls.
     """
     try:
-        # Check cache first
-        cache_key = f"{request.meal_name.lower()}_{request.language}"
+        # Check cache first - "Palak Paneer", "palak  paneer" and "Paneer Palak" share one entry
+        cache_key = f"{normalize_meal_query(request.meal_name)}_{request.language}"
         if cache_key in recipe_video_cache:
-            logger.info(f"Cache hit for recipe: {request.meal_name}")
+            logger.info("Cache hit for recipe: %s", request.meal_name)
             return recipe_video_cache[cache_key]
 
         # If no YouTube API key, return search URL instead
@@ -2404,91 +2639,13 @@ async def get_recipe_video(request: RecipeVideoRequest):
                 "fallback": True
             }
         
-        logger.info(f"Fetching YouTube video for: {request.meal_name} (language: {request.language})")
-
-        # Build search query
-        language_hint = ""
-        if request.language == "hindi":
-            language_hint = " hindi"
-        elif request.language == "english":
-            language_hint = " english"
-
-        search_query = f"{request.meal_name} recipe easy indian{language_hint}"
-
-        # Call YouTube Data API
-        youtube_url = "https://www.googleapis.com/youtube/v3/search"
-        params = {
-            "part": "snippet",
-            "q": search_query,
-            "type": "video",
-            "videoDuration": "medium",  # 4-20 minutes
-            "maxResults": 3,
-            "key": YOUTUBE_API_KEY,
-            "relevanceLanguage": "hi" if request.language == "hindi" else "en",
-            "order": "relevance"
-        }
-
-        response = requests.get(youtube_url, params=params, timeout=10)
-
-        if response.status_code != 200:
-            error_data = response.json() if response.content else {}
-            error_message = error_data.get("error", {}).get("message", "Unknown error")
-            logger.error(f"YouTube API error: {response.status_code} - {error_message}")
-            
-            # If API key is invalid or missing, return fallback
-            if response.status_code == 403 or "API key" in error_message:
-                logger.warning("YouTube API key invalid or quota exceeded, using fallback")
-                search_query = f"{request.meal_name} recipe easy indian"
-                return {
-                    "success": True,
-                    "video_id": None,
-                    "title": f"Search: {request.meal_name} Recipe",
-                    "channel": "YouTube",
-                    "thumbnail": "https://via.placeholder.com/480x360?text=API+Key+Issue",
-                    "url": f"https://www.youtube.com/results?search_query={search_query.replace(' ', '+')}",
-                    "fallback": True
-                }
-            
-            raise HTTPException(status_code=500, detail=f"YouTube API request failed: {error_message}")
-
-        data = response.json()
-
-        if not data.get("items"):
-            logger.info(f"No videos found for: {request.meal_name}")
-            return {
-                "success": False,
-                "message": "No recipe videos found",
-                "fallback": True,
-                "url": f"https://www.youtube.com/results?search_query={search_query.replace(' ', '+')}"
-            }
-
-        # Get first video
-        video = data["items"][0]
-        video_id = video["id"]["videoId"]
-        snippet = video["snippet"]
-
-        result = {
-            "success": True,
-            "video_id": video_id,
-            "title": snippet["title"],
-            "channel": snippet["channelTitle"],
-            "thumbnail": snippet["thumbnails"]["high"]["url"],
-            "url": f"https://www.youtube.com/watch?v={video_id}",
-            "embed_url": f"https://www.youtube.com/embed/{video_id}",
-            "fallback": False
-        }
-
-        # Cache the result
-        recipe_video_cache[cache_key] = result
-        
-        logger.info(f"Successfully fetched YouTube video: {result['title']} (ID: {video_id})")
-
-        return result
+        # Concurrent misses for the same meal share one YouTube call instead of each spending quota
+        return await singleflight(recipe_video_inflight, cache_key, lambda: fetch_recipe_video(request, cache_key))
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Recipe video error: {e}")
+        logger.error("Recipe video error: %s", e)
         # Fallback to search link
         search_query = f"{request.meal_name} recipe easy indian"
         return {
@@ -2525,6 +2682,17 @@ class CheckInAnalysisResponse(BaseModel):
     previous_calories: Optional[int] = None  # Original calories before adjustment
     recommendations: List[str]
 
+def load_checkin_context(db: Session, plan_id: int):
+    """(plan, user, previous check-ins newest first) for a weekly check-in; plan is None if missing"""
+    plan = db.query(DietPlan).filter(DietPlan.id == plan_id).first()
+    if not plan:
+        return None, None, []
+    user = db.query(User).filter(User.id == plan.user_id).first()
+    previous_checkins = db.query(WeeklyCheckIn).filter(
+        WeeklyCheckIn.diet_plan_id == plan_id
+    ).order_by(WeeklyCheckIn.week_number.desc()).all()
+    return plan, user, previous_checkins
+
 @app.post("/weekly-checkin", response_model=CheckInAnalysisResponse)
 async def submit_weekly_checkin(
     request: WeeklyCheckInRequest,
@@ -2541,24 +2709,19 @@ async def submit_weekly_checkin(
     5. Trigger adaptive calorie adjustments if needed
     """
     try:
-        # 1. Get diet plan and user info
-        plan = db.query(DietPlan).filter(DietPlan.id == request.plan_id).first()
+        # 1. Get diet plan, user info and previous check-ins (sync SQLAlchemy - run in a worker thread)
+        plan, user, previous_checkins = await asyncio.to_thread(load_checkin_context, db, request.plan_id)
         if not plan:
             raise HTTPException(status_code=404, detail="Diet plan not found")
 
-        user = db.query(User).filter(User.id == plan.user_id).first()
-
         # Parse user profile data
-        profile_data = json.loads(user.profile_data) if isinstance(user.profile_data, str) else user.profile_data
+        # JSON column returns a dict; rows written before the JSONB switch may still hold an encoded string
+        profile_data = load_json_column(user.profile_data, {})
         starting_weight = profile_data.get('weight_kg', request.current_weight_kg)
         user_goal = profile_data.get('goal', 'Not specified')
         user_age = profile_data.get('age', 30)
 
-        # 2. Get previous check-ins to calculate week number and trends
-        previous_checkins = db.query(WeeklyCheckIn).filter(
-            WeeklyCheckIn.diet_plan_id == request.plan_id
-        ).order_by(WeeklyCheckIn.week_number.desc()).all()
-
+        # 2. Previous check-ins give the week number and trends
         week_number = len(previous_checkins) + 1
 
         # Calculate weight change from previous week
@@ -2581,18 +2744,15 @@ async def submit_weekly_checkin(
             is_plateau = all(change < 0.2 for change in recent_changes) and abs(weight_change_kg) < 0.2
 
         # 4. Calculate expected vs actual progress
-        plan_json = json.loads(plan.plan_json) if isinstance(plan.plan_json, str) else plan.plan_json
+        plan_json = load_json_column(plan.plan_json, {})
         expected_results = plan_json.get('expected_results', {})
         expected_weekly_change = expected_results.get('weekly_change_kg', 0.5) if user_goal == 'Weight Loss' else 0.25
 
         variance_kg = abs(weight_change_kg) - expected_weekly_change
         is_off_track = abs(variance_kg) > (expected_weekly_change * 0.5)  # >50% variance
 
-        # 5. Build AI prompt for insights
-        ai_prompt = f"""
-You are a nutrition AI analyzing a user's weekly progress. Provide personalized insights.
-
-USER PROFILE:
+        # 5. Build AI prompt for insights (static instructions live in WEEKLY_CHECKIN_SYSTEM_PROMPT)
+        ai_prompt = f"""USER PROFILE:
 - Goal: {user_goal}
 - Age: {user_age}
 - Starting Weight: {starting_weight}kg
@@ -2611,40 +2771,19 @@ TREND ANALYSIS:
 - Expected Weekly Change: {expected_weekly_change:+.2f}kg
 - Variance from Expected: {variance_kg:+.2f}kg
 - Plateau Detected: {is_plateau}
-- Off Track: {is_off_track}
-
-TASK:
-1. Analyze progress (is it good, too fast, too slow, plateau?)
-2. Provide 3-5 SHORT, ACTIONABLE recommendations (bullet points)
-3. Suggest calorie adjustment if needed (return number or null)
-4. Keep tone SUPPORTIVE and MOTIVATING
-
-OUTPUT FORMAT (JSON):
-{{
-  "progress_assessment": "1-2 sentences analyzing progress",
-  "is_on_track": true/false,
-  "plateau_detected": true/false,
-  "recommendations": [
-    "Recommendation 1",
-    "Recommendation 2",
-    "Recommendation 3"
-  ],
-  "calorie_adjustment": -100 or null (suggest adjustment amount, or null if no change needed),
-  "adjustment_reason": "plateau" or "too_fast" or "too_slow" or null,
-  "motivation_message": "Short encouraging message"
-}}
-"""
+- Off Track: {is_off_track}"""
 
         # 6. Call OpenAI for AI insights
-        ai_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": ai_prompt}],
-            temperature=0.7,
+        ai_response = await ai_json_completion(
+            messages=[
+                {"role": "system", "content": WEEKLY_CHECKIN_SYSTEM_PROMPT},
+                {"role": "user", "content": ai_prompt}
+            ],
             max_tokens=500,
-            response_format={"type": "json_object"}
+            temperature=0.7
         )
 
-        insights_json = json.loads(ai_response.choices[0].message.content.strip())
+        insights_json = orjson.loads(ai_response.choices[0].message.content.strip())
 
         # 7. Determine calorie adjustment
         adjusted_calories = None
@@ -2706,7 +2845,7 @@ OUTPUT FORMAT (JSON):
             # Calculate from profile
             calories_min, calories_max = calculate_calories_from_profile(profile_data)
             current_calories_mid = (calories_min + calories_max) // 2
-            logger.info(f"Calculated calories from profile: {calories_min}-{calories_max} (mid: {current_calories_mid})")
+            logger.info("Calculated calories from profile: %s-%s (mid: %s)", calories_min, calories_max, current_calories_mid)
 
         if insights_json.get('calorie_adjustment'):
             previous_calories = current_calories_mid  # Store original value
@@ -2740,7 +2879,7 @@ OUTPUT FORMAT (JSON):
             hunger_level=request.hunger_level,
             challenges=request.challenges,
             notes=request.notes,
-            ai_insights_json=json.dumps(insights_json),
+            ai_insights_json=insights_json,
             adjusted_calories=adjusted_calories,
             adjustment_reason=adjustment_reason
         )
@@ -2764,12 +2903,14 @@ OUTPUT FORMAT (JSON):
         )
         db.add(snapshot)
 
-        db.commit()
+        # One flush writes all rows; read user.id first - commit expires it and would cost a re-SELECT
+        user_id = user.id
+        await asyncio.to_thread(db.commit)
 
-        logger.info(f"Weekly check-in completed for user {user.id}, week {week_number}")
+        logger.info("Weekly check-in completed for user %s, week %s", user_id, week_number)
 
-        # 10. Return response
-        return CheckInAnalysisResponse(
+        # 10. Return response (fields built above, so skip re-validating on construction)
+        return CheckInAnalysisResponse.model_construct(
             success=True,
             week_number=week_number,
             weight_change_kg=weight_change_kg,
@@ -2782,24 +2923,38 @@ OUTPUT FORMAT (JSON):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Weekly check-in error: {e}")
+        logger.error("Weekly check-in error: %s", e)
         raise HTTPException(status_code=500, detail=f"Check-in failed: {str(e)}")
 
 @app.get("/progress-history/{plan_id}")
-async def get_progress_history(plan_id: int, db: Session = Depends(get_db)):
+def get_progress_history(plan_id: int, db: Session = Depends(get_db)):
     """Get all check-ins and progress snapshots for a diet plan"""
     try:
-        checkins = db.query(WeeklyCheckIn).filter(
-            WeeklyCheckIn.diet_plan_id == plan_id
-        ).order_by(WeeklyCheckIn.week_number.asc()).all()
-
-        snapshots = db.query(ProgressSnapshot).filter(
-            ProgressSnapshot.diet_plan_id == plan_id
-        ).order_by(ProgressSnapshot.snapshot_date.asc()).all()
-
-        calorie_adjustments = db.query(CalorieAdjustmentLog).filter(
-            CalorieAdjustmentLog.diet_plan_id == plan_id
-        ).order_by(CalorieAdjustmentLog.adjustment_date.desc()).all()
+        # Core selects of just the returned columns - rows serialize without ORM hydration
+        checkins = db.execute(
+            select(WeeklyCheckIn.week_number, WeeklyCheckIn.checkin_date, WeeklyCheckIn.current_weight_kg,
+                   WeeklyCheckIn.weight_change_kg, WeeklyCheckIn.diet_adherence_percent,
+                   WeeklyCheckIn.exercise_adherence_percent, WeeklyCheckIn.energy_level, WeeklyCheckIn.hunger_level,
+                   WeeklyCheckIn.ai_insights_json, WeeklyCheckIn.adjusted_calories)
+            .where(WeeklyCheckIn.diet_plan_id == plan_id)
+            .order_by(WeeklyCheckIn.week_number.asc())
+        ).all()
+
+        snapshots = db.execute(
+            select(ProgressSnapshot.snapshot_date, ProgressSnapshot.weight_kg, ProgressSnapshot.total_weight_change_kg,
+                   ProgressSnapshot.avg_weekly_change_kg, ProgressSnapshot.weeks_on_plan, ProgressSnapshot.weight_trend,
+                   ProgressSnapshot.is_plateau)
+            .where(ProgressSnapshot.diet_plan_id == plan_id)
+            .order_by(ProgressSnapshot.snapshot_date.asc())
+        ).all()
+
+        calorie_adjustments = db.execute(
+            select(CalorieAdjustmentLog.adjustment_date, CalorieAdjustmentLog.previous_calories,
+                   CalorieAdjustmentLog.new_calories, CalorieAdjustmentLog.adjustment_amount,
+                   CalorieAdjustmentLog.reason, CalorieAdjustmentLog.ai_explanation)
+            .where(CalorieAdjustmentLog.diet_plan_id == plan_id)
+            .order_by(CalorieAdjustmentLog.adjustment_date.desc())
+        ).all()
 
         return {
             "success": True,
@@ -2813,7 +2968,7 @@ async def get_progress_history(plan_id: int, db: Session = Depends(get_db)):
                     "exercise_adherence": c.exercise_adherence_percent,
                     "energy_level": c.energy_level,
                     "hunger_level": c.hunger_level,
-                    "insights": json.loads(c.ai_insights_json) if c.ai_insights_json else {},
+                    "insights": load_json_column(c.ai_insights_json, {}),
                     "adjusted_calories": c.adjusted_calories
                 }
                 for c in checkins
@@ -2843,11 +2998,11 @@ async def get_progress_history(plan_id: int, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        logger.error(f"Progress history error: {e}")
+        logger.error("Progress history error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch progress: {str(e)}")
 
 @app.post("/adaptive-calorie-adjustment/{plan_id}")
-async def trigger_adaptive_adjustment(
+def trigger_adaptive_adjustment(
     plan_id: int,
     manual_adjustment: Optional[int] = None,
     db: Session = Depends(get_db)
@@ -2870,7 +3025,7 @@ async def trigger_adaptive_adjustment(
             raise HTTPException(status_code=404, detail="No progress data found. Complete a check-in first.")
 
         # Get current calorie target
-        plan_json = json.loads(plan.plan_json) if isinstance(plan.plan_json, str) else plan.plan_json
+        plan_json = load_json_column(plan.plan_json, {})
         current_calories = plan_json.get('nutrition_targets', {}).get('calories_range', '1800-1900')
         current_calories_mid = int(current_calories.split('-')[0]) + 50
 
@@ -2916,7 +3071,7 @@ async def trigger_adaptive_adjustment(
         db.add(adjustment_log)
         db.commit()
 
-        logger.info(f"Adaptive calorie adjustment: {current_calories_mid} → {adjusted_calories} ({reason})")
+        logger.info("Adaptive calorie adjustment: %s → %s (%s)", current_calories_mid, adjusted_calories, reason)
 
         return {
             "success": True,
@@ -2930,13 +3085,59 @@ async def trigger_adaptive_adjustment(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Adaptive calorie adjustment error: {e}")
+        logger.error("Adaptive calorie adjustment error: %s", e)
         raise HTTPException(status_code=500, detail=f"Adjustment failed: {str(e)}")
 
+class AgentBulkRequest(BaseModel):
+    """Any combination of the plan-page AI calls; omitted parts are skipped"""
+    plan_id: Optional[int] = None  # Grocery list for this plan
+    checkin: Optional[WeeklyCheckInRequest] = None
+    swap: Optional[SwapMealRequest] = None
+
+async def run_with_session(handler, *args):
+    """Await a db-using handler with its own session - concurrent parts can't share one (each uses worker threads)"""
+    db = SessionLocal()
+    try:
+        return await handler(*args, db=db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@app.post("/agent/bulk")
+async def agent_bulk(request: AgentBulkRequest):
+    """
+    Runs the plan page's grocery, weekly check-in and meal swap agents concurrently in one request,
+    so the page waits for the slowest AI call instead of three sequential round-trips.
+    Each part returns what its own endpoint would, or {"error", "status_code"} if it failed.
+    """
+    parts = {}
+    if request.plan_id is not None:
+        parts["grocery"] = run_with_session(generate_grocery, request.plan_id)
+    if request.checkin is not None:
+        parts["checkin"] = run_with_session(submit_weekly_checkin, request.checkin)
+    if request.swap is not None:
+        parts["swap"] = swap_meal(request.swap)
+    if not parts:
+        raise HTTPException(status_code=400, detail="Nothing requested: pass plan_id, checkin and/or swap")
+
+    results = await asyncio.gather(*parts.values(), return_exceptions=True)
+    response = {}
+    for name, result in zip(parts, results):
+        if isinstance(result, HTTPException):
+            response[name] = {"error": result.detail, "status_code": result.status_code}
+        elif isinstance(result, Exception):
+            logger.error("Bulk agent %s error: %s", name, result)
+            response[name] = {"error": str(result), "status_code": 500}
+        else:
+            response[name] = result
+    return response
+
 # --- CONVERSATIONAL AI CHAT ENDPOINTS ---
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+def chat_with_ai(request: ChatRequest):
     """
     Conversational AI endpoint for diet-related questions
 
@@ -2960,7 +3161,7 @@ async def chat_with_ai(request: ChatRequest):
         # Get smart suggestions based on context
         suggestions = agent.get_quick_suggestions(request.context)
 
-        logger.info(f"Chat session {request.session_id}: {len(request.message)} chars in, {len(ai_response)} chars out")
+        logger.info("Chat session %s: %s chars in, %s chars out", request.session_id, len(request.message), len(ai_response))
 
         return ChatResponse(
             success=True,
@@ -2969,7 +3170,7 @@ async def chat_with_ai(request: ChatRequest):
         )
 
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: %s", e)
         return ChatResponse(
             success=False,
             response="Sorry, I'm having trouble responding right now. Please try again in a moment.",
@@ -2998,7 +3199,7 @@ async def get_chat_history(session_id: str):
         }
 
     except Exception as e:
-        logger.error(f"Error fetching chat history: {e}")
+        logger.error("Error fetching chat history: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch chat history")
 
 @app.delete("/chat/history/{session_id}")
@@ -3028,7 +3229,7 @@ async def clear_chat_history(session_id: str):
             }
 
     except Exception as e:
-        logger.error(f"Error clearing chat history: {e}")
+        logger.error("Error clearing chat history: %s", e)
         raise HTTPException(status_code=500, detail="Failed to clear chat history")
 
 
@@ -3044,7 +3245,7 @@ class GroceryOptimizeRequest(BaseModel):
 
 
 @app.post("/optimize-grocery")
-async def optimize_grocery_list(request: GroceryOptimizeRequest):
+def optimize_grocery_list(request: GroceryOptimizeRequest):
     """
     Analyze grocery list and suggest cheaper alternatives using AI
 
@@ -3057,7 +3258,7 @@ async def optimize_grocery_list(request: GroceryOptimizeRequest):
     Returns AI-powered optimization suggestions
     """
     try:
-        logger.info(f"Optimizing grocery list: {request.grocery_list}")
+        logger.info("Optimizing grocery list: %s", request.grocery_list)
 
         # Get AI analysis with swap suggestions
         analysis = analyze_grocery_list_with_ai(
@@ -3072,12 +3273,12 @@ async def optimize_grocery_list(request: GroceryOptimizeRequest):
         }
 
     except Exception as e:
-        logger.error(f"Error optimizing grocery: {e}")
+        logger.error("Error optimizing grocery: %s", e)
         raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
 
 
 @app.post("/auto-optimize-grocery")
-async def auto_optimize_grocery(request: GroceryOptimizeRequest):
+def auto_optimize_grocery(request: GroceryOptimizeRequest):
     """
     Automatically swap expensive ingredients for cheaper alternatives
 
@@ -3087,7 +3288,7 @@ async def auto_optimize_grocery(request: GroceryOptimizeRequest):
     Returns optimized grocery list with swaps already applied
     """
     try:
-        logger.info(f"Auto-optimizing grocery (budget_mode={request.budget_mode})")
+        logger.info("Auto-optimizing grocery (budget_mode=%s)", request.budget_mode)
 
         # Perform automatic swaps
         result = auto_optimize_grocery_list(
@@ -3105,7 +3306,7 @@ async def auto_optimize_grocery(request: GroceryOptimizeRequest):
         }
 
     except Exception as e:
-        logger.error(f"Error in auto-optimization: {e}")
+        logger.error("Error in auto-optimization: %s", e)
         raise HTTPException(status_code=500, detail=f"Auto-optimization failed: {str(e)}")
 
 
@@ -3138,7 +3339,7 @@ async def get_ingredient_price_endpoint(ingredient: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching price: {e}")
+        logger.error("Error fetching price: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch price")
 
 
@@ -3174,7 +3375,7 @@ async def get_cheaper_alternatives_endpoint(ingredient: str, max_price_ratio: fl
         }
 
     except Exception as e:
-        logger.error(f"Error finding alternatives: {e}")
+        logger.error("Error finding alternatives: %s", e)
         raise HTTPException(status_code=500, detail="Failed to find alternatives")
 
 
@@ -3200,12 +3401,12 @@ async def get_price_alerts():
         }
 
     except Exception as e:
-        logger.error(f"Error fetching price alerts: {e}")
+        logger.error("Error fetching price alerts: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch price alerts")
 
 
 @app.post("/optimize-plan-grocery/{plan_id}")
-async def optimize_plan_grocery(plan_id: int, budget_mode: bool = False, db: Session = Depends(get_db)):
+def optimize_plan_grocery(plan_id: int, budget_mode: bool = False, db: Session = Depends(get_db)):
     """
     Optimize grocery list for an existing diet plan
 
@@ -3230,7 +3431,7 @@ async def optimize_plan_grocery(plan_id: int, budget_mode: bool = False, db: Ses
 
         # Parse grocery list
         try:
-            grocery_data = json.loads(plan.grocery_list) if plan.grocery_list else {}
+            grocery_data = orjson.loads(plan.grocery_list) if plan.grocery_list else {}
             grocery_items = []
 
             # Extract ingredient names from grocery data
@@ -3282,7 +3483,7 @@ async def optimize_plan_grocery(plan_id: int, budget_mode: bool = False, db: Ses
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error optimizing plan grocery: {e}")
+        logger.error("Error optimizing plan grocery: %s", e)
         raise HTTPException(status_code=500, detail="Failed to optimize plan grocery")
 
 
@@ -0,0 +1,81 @@
+"""
+Database Migration: Add created_at / per-plan indexes for ordered lookups
+Run this script once on existing databases (create_all only indexes brand-new tables)
+"""
+
+import os
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# (index name, table, columns) - must match the models in main.py
+INDEXES = [
+    ("ix_diet_plans_created_at", "diet_plans", "created_at"),
+    ("ix_diet_plans_user_created", "diet_plans", "user_id, created_at"),
+    ("ix_orders_created_at", "orders", "created_at"),
+    ("ix_orders_user_created", "orders", "user_id, created_at"),
+    ("ix_weekly_checkins_plan_week", "weekly_checkins", "diet_plan_id, week_number"),
+    ("ix_progress_snapshots_plan_date", "progress_snapshots", "diet_plan_id, snapshot_date"),
+    ("ix_calorie_adjustments_plan_date", "calorie_adjustments", "diet_plan_id, adjustment_date"),
+]
+
+def migrate_database():
+    """Create the ordering indexes (see INDEXES) if they don't exist"""
+
+    # Get database URL from environment (falls back to the local SQLite file like main.py)
+    database_url = os.getenv("DATABASE_URL", "sqlite:///./gharkadiet.db")
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    print(f"🔗 Connecting to database...")
+    print(f"   URL: {database_url[:20]}...{database_url[-20:]}")
+
+    try:
+        engine = create_engine(database_url)
+        inspector = inspect(engine)
+        is_postgres = engine.dialect.name == "postgresql"
+
+        # Postgres: CONCURRENTLY avoids locking writes on Neon, but can't run inside a transaction
+        create_sql = "CREATE INDEX CONCURRENTLY IF NOT EXISTS" if is_postgres else "CREATE INDEX IF NOT EXISTS"
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, table, columns in INDEXES:
+                if table not in inspector.get_table_names():
+                    print(f"   ⚠️ Skipping {name}: '{table}' table does not exist yet")
+                    continue
+
+                existing = [ix['name'] for ix in inspector.get_indexes(table)]
+                if name in existing:
+                    print(f"   ✅ {name} already exists")
+                    continue
+
+                print(f"   Creating {name} on {table} ({columns})...")
+                conn.execute(text(f"{create_sql} {name} ON {table} ({columns})"))
+                print(f"   ✅ Created {name}")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("DATABASE MIGRATION: Add Ordering Indexes")
+    print("=" * 60)
+    print()
+
+    success = migrate_database()
+
+    print()
+    print("=" * 60)
+    if success:
+        print("✅ MIGRATION COMPLETED SUCCESSFULLY")
+    else:
+        print("❌ MIGRATION FAILED")
+        print()
+        print("Please check the error messages above and verify DATABASE_URL is correct")
+    print("=" * 60)
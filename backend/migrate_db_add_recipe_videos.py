@@ -0,0 +1,69 @@
+"""
+Database Migration: Add the recipe_videos table (persistent YouTube result cache)
+Run this once on databases started with RUN_MIGRATIONS=0 (create_all never runs there)
+"""
+
+import os
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_database():
+    """Create the recipe_videos table if it doesn't exist - must match RecipeVideo in main.py"""
+
+    # Get database URL from environment (falls back to the local SQLite file like main.py)
+    database_url = os.getenv("DATABASE_URL", "sqlite:///./gharkadiet.db")
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    print(f"🔗 Connecting to database...")
+    print(f"   URL: {database_url[:20]}...{database_url[-20:]}")
+
+    try:
+        engine = create_engine(database_url)
+        inspector = inspect(engine)
+
+        if "recipe_videos" in inspector.get_table_names():
+            print("   ✅ recipe_videos already exists")
+            return True
+
+        # Same JSON variant as main.py's JsonType: JSONB on Postgres, JSON (text) on SQLite
+        json_type = "JSONB" if engine.dialect.name == "postgresql" else "JSON"
+
+        print("   Creating recipe_videos...")
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS recipe_videos (
+                    cache_key VARCHAR PRIMARY KEY,
+                    video_json {json_type},
+                    created_at TIMESTAMP
+                )
+            """))
+        print("   ✅ Created recipe_videos")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("DATABASE MIGRATION: Add recipe_videos Table")
+    print("=" * 60)
+    print()
+
+    success = migrate_database()
+
+    print()
+    print("=" * 60)
+    if success:
+        print("✅ MIGRATION COMPLETED SUCCESSFULLY")
+    else:
+        print("❌ MIGRATION FAILED")
+        print()
+        print("Please check the error messages above and verify DATABASE_URL is correct")
+    print("=" * 60)
@@ -0,0 +1,109 @@
+"""
+Database Migration: Convert the JSON payload columns from TEXT to JSONB
+Run this once on Postgres (Neon). SQLite needs nothing - its JSON type reads the existing text as-is.
+"""
+
+import os
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# table -> columns that the models in main.py declare as JSON (JSONB on Postgres)
+JSONB_COLUMNS = {
+    "users": ["profile_data", "medical_issues"],
+    "diet_plans": ["plan_json", "grocery_json"],
+    "weekly_checkins": ["ai_insights_json"],
+}
+
+def migrate_database():
+    """ALTER the JSON payload columns to JSONB, parsing the existing text in place"""
+
+    # Get database URL from environment
+    database_url = os.getenv("DATABASE_URL")
+
+    if not database_url:
+        print("❌ ERROR: DATABASE_URL not found in environment variables")
+        print("Please set DATABASE_URL in your .env file or environment")
+        return False
+
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    print(f"🔗 Connecting to database...")
+    print(f"   URL: {database_url[:20]}...{database_url[-20:]}")
+
+    try:
+        engine = create_engine(database_url)
+
+        if engine.dialect.name != "postgresql":
+            print("\n✅ Not a Postgres database - nothing to migrate.")
+            return True
+
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+
+        if 'users' not in tables:
+            print("❌ ERROR: 'users' table does not exist!")
+            print("Please run the main application first to create tables")
+            return False
+
+        pending = []
+        for table, columns in JSONB_COLUMNS.items():
+            if table not in tables:
+                print(f"   ⚠️ Skipping '{table}': table does not exist yet")
+                continue
+            column_types = {col['name']: str(col['type']).upper() for col in inspector.get_columns(table)}
+            pending += [(table, col) for col in columns if column_types.get(col) != "JSONB"]
+
+        if not pending:
+            print("\n✅ Database schema is already up to date!")
+            return True
+
+        print(f"\n🔧 Converting to JSONB: {', '.join(f'{t}.{c}' for t, c in pending)}")
+
+        with engine.connect() as conn:
+            trans = conn.begin()
+
+            try:
+                for table, col in pending:
+                    print(f"   Converting '{table}.{col}'...")
+                    # Empty strings become NULL; everything else was written with json.dumps / orjson.dumps
+                    conn.execute(text(f"""
+                        ALTER TABLE {table}
+                        ALTER COLUMN {col} TYPE JSONB
+                        USING NULLIF({col}, '')::jsonb
+                    """))
+                    print(f"   ✅ Converted '{table}.{col}'")
+
+                trans.commit()
+                print("\n✅ Migration completed successfully!")
+                return True
+
+            except Exception as e:
+                trans.rollback()
+                print(f"\n❌ Migration failed: {e}")
+                return False
+
+    except Exception as e:
+        print(f"\n❌ Database connection error: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("DATABASE MIGRATION: JSON columns -> JSONB")
+    print("=" * 60)
+    print()
+
+    success = migrate_database()
+
+    print()
+    print("=" * 60)
+    if success:
+        print("✅ MIGRATION COMPLETED SUCCESSFULLY")
+    else:
+        print("❌ MIGRATION FAILED")
+        print()
+        print("Please check the error messages above and verify DATABASE_URL is correct")
+    print("=" * 60)
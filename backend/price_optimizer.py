@@ -4,13 +4,20 @@ Monitors prices, suggests swaps, saves money autonomously
 """
 
 import os
+import re
 import json
+import functools
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from anthropic import Anthropic
 
-# Initialize Anthropic client
-anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Anthropic client - SDK imported on first use so app startup doesn't pay for it
+@functools.cache
+def get_anthropic_client():
+    from anthropic import Anthropic
+    return Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+# Fenced ```json ... ``` block in a model reply (compiled once, single scan)
+JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)```", re.S)
 
 
 # Nutritional equivalence database
@@ -239,7 +246,7 @@ Be conversational, friendly, and money-conscious. Format as JSON with keys:
 """
 
     try:
-        message = anthropic_client.messages.create(
+        message = get_anthropic_client().messages.create(
             model="claude-3-5-sonnet-20241022",
             max_tokens=1500,
             messages=[{
@@ -252,10 +259,9 @@ Be conversational, friendly, and money-conscious. Format as JSON with keys:
 
         # Try to parse JSON from response
         # Look for JSON block
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            json_str = response_text[json_start:json_end].strip()
+        block = JSON_BLOCK_RE.search(response_text)
+        if block:
+            json_str = block.group(1).strip()
         elif "{" in response_text and "}" in response_text:
             json_start = response_text.find("{")
             json_end = response_text.rfind("}") + 1
@@ -0,0 +1,52 @@
+"""
+Shared setup for the unit tests (run from backend/: `python -m pytest`).
+main.py reads its configuration at import time, so the environment is pinned here first:
+a throwaway SQLite file and dummy API keys - no test talks to a real database or paid API.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Empty (not unset) so load_dotenv() can't pull a real DATABASE_URL in from a local .env
+os.environ["DATABASE_URL"] = ""
+os.environ["OPENAI_API_KEY"] = "test-openai-key"
+os.environ["ANTHROPIC_API_KEY"] = "test-anthropic-key"
+os.environ["YOUTUBE_API_KEY"] = ""
+
+import main  # noqa: E402
+import orjson  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+# Point the app at a throwaway SQLite file instead of ./gharkadiet.db (the engine connects lazily, so nothing
+# has touched that file yet); same JSON codec as main's engine
+TEST_DATABASE = os.path.join(tempfile.mkdtemp(prefix="gharkadiet-tests-"), "gharkadiet.db")
+main.engine = create_engine(
+    f"sqlite:///{TEST_DATABASE}",
+    connect_args={"check_same_thread": False},
+    json_serializer=lambda value: orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode(),
+    json_deserializer=orjson.loads,
+)
+main.SessionLocal.configure(bind=main.engine)
+main.Base.metadata.create_all(bind=main.engine)
+
+
+@pytest.fixture
+def client():
+    """App client without the startup/shutdown hooks (tables are created above)"""
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def db():
+    session = main.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
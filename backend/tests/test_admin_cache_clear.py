@@ -0,0 +1,25 @@
+"""/admin/cache/clear is only reachable with ADMIN_TOKEN"""
+
+import main
+
+
+def test_disabled_without_admin_token(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert client.post("/admin/cache/clear", headers={"X-Admin-Token": "anything"}).status_code == 403
+
+
+def test_rejects_missing_or_wrong_token(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    main.swap_meal_cache["kept"] = {}
+    assert client.post("/admin/cache/clear").status_code == 401
+    assert client.post("/admin/cache/clear", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert "kept" in main.swap_meal_cache
+
+
+def test_clears_with_the_right_token(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    main.swap_meal_cache["cleared"] = {}
+    response = client.post("/admin/cache/clear", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json()["cleared"]["swap_meals"] >= 1
+    assert "cleared" not in main.swap_meal_cache
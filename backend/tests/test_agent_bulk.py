@@ -0,0 +1,47 @@
+"""/agent/bulk runs the plan-page agents concurrently and reports each part on its own"""
+
+import main
+
+CHECKIN = {"plan_id": 1, "current_weight_kg": 69.5}
+SWAP = {"meal_text": "2 Rotis + 1 cup Dal", "meal_type": "lunch", "user_profile": {"diet_pref": "vegetarian"}}
+
+
+def test_nothing_requested_is_a_400(client):
+    response = client.post("/agent/bulk", json={})
+    assert response.status_code == 400
+
+
+def test_partial_failures_are_reported_per_part(client, monkeypatch):
+    async def fake_checkin(request, db):
+        assert db is not None  # Each part gets its own session
+        return {"success": True, "week_number": 1, "plan_id": request.plan_id}
+
+    async def failing_swap(request):
+        raise RuntimeError("AI unavailable")
+
+    monkeypatch.setattr(main, "submit_weekly_checkin", fake_checkin)
+    monkeypatch.setattr(main, "swap_meal", failing_swap)
+
+    response = client.post("/agent/bulk", json={"plan_id": 987654, "checkin": CHECKIN, "swap": SWAP})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "grocery": {"error": "Plan not found", "status_code": 404},  # HTTPException keeps its status
+        "checkin": {"success": True, "week_number": 1, "plan_id": 1},
+        "swap": {"error": "AI unavailable", "status_code": 500},      # Anything else is a 500
+    }
+
+
+def test_only_requested_parts_run(client, monkeypatch):
+    async def fake_swap(request):
+        return {"alternatives": [{"name": "Poha"}]}
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("not requested")
+
+    monkeypatch.setattr(main, "swap_meal", fake_swap)
+    monkeypatch.setattr(main, "submit_weekly_checkin", unexpected)
+    monkeypatch.setattr(main, "generate_grocery", unexpected)
+
+    response = client.post("/agent/bulk", json={"swap": SWAP})
+    assert response.json() == {"swap": {"alternatives": [{"name": "Poha"}]}}
@@ -0,0 +1,59 @@
+"""Name-free generated plans: address_plan and the shared diet_plan_cache"""
+
+import main
+
+PROFILE = dict(age=30, gender="female", height_cm=160, weight_kg=70, target_weight_kg=62, goal="Weight Loss",
+               goal_pace="balanced", diet_pref="Vegetarian", region="South Indian", budget="medium",
+               medical_manual=["Diabetes"])
+
+
+def test_name_goes_in_front_of_the_summary():
+    plan = main.address_plan({"summary": "You're aiming to lose 8kg"}, "Asha")
+    assert plan["summary"] == "Asha, you're aiming to lose 8kg"
+
+
+def test_leading_you_or_your_is_lowercased_only_as_a_word():
+    assert main.address_plan({"summary": "Your goal is 62kg"}, "Ravi")["summary"] == "Ravi, your goal is 62kg"
+    assert main.address_plan({"summary": "Youthful energy..."}, "Ravi")["summary"] == "Ravi, Youthful energy..."
+    assert main.address_plan({"summary": "you're set"}, "Ravi")["summary"] == "Ravi, you're set"
+
+
+def test_blank_name_or_summary_is_left_alone():
+    assert main.address_plan({"summary": "You're aiming"}, "  ")["summary"] == "You're aiming"
+    assert main.address_plan({"summary": ""}, "Asha")["summary"] == ""
+    assert main.address_plan({"summary": None}, "Asha")["summary"] is None
+    assert main.address_plan({"days": []}, "Asha") == {"days": []}
+
+
+def test_returns_a_deep_copy():
+    cached = {"summary": "You're aiming", "days": [{"day": 1, "breakfast": "Poha"}]}
+    plan = main.address_plan(cached, "Asha")
+    plan["days"][0]["breakfast"] = "Upma"
+    assert cached == {"summary": "You're aiming", "days": [{"day": 1, "breakfast": "Poha"}]}
+
+
+def test_cached_plan_never_carries_another_users_name(client, db, monkeypatch):
+    calls = []
+
+    async def fake_diet_plan(prompt_fields, user_prompt):
+        calls.append((prompt_fields, user_prompt))
+        return {"summary": "You're aiming to reach 62kg", "days": [{"day": day} for day in range(1, 8)]}
+
+    monkeypatch.setattr(main, "call_ai_diet_plan", fake_diet_plan)
+    main.diet_plan_cache.clear()
+
+    first = client.post("/generate-diet", json={**PROFILE, "name": "Asha Verma", "phone": "9000000001"}).json()
+    second = client.post("/generate-diet", json={**PROFILE, "name": "Meena", "phone": "9000000002"}).json()
+
+    assert len(calls) == 1  # Second request is a cache hit
+    prompt_fields, user_prompt = calls[0]
+    assert "Asha" not in user_prompt and "name" not in prompt_fields and "phone" not in prompt_fields
+    assert "Asha" not in main.DIET_OVERVIEW_PROMPT_TEMPLATE.format(**prompt_fields)
+    assert first["diet"]["summary"] == "Asha Verma, you're aiming to reach 62kg"
+    assert second["diet"]["summary"] == "Meena, you're aiming to reach 62kg"
+    assert "Asha" not in str(main.diet_plan_cache[main.diet_profile_key(main.UserProfile(**PROFILE))])
+
+    # Committed before the response, so the id is usable right away
+    stored = db.get(main.DietPlan, second["plan_id"])
+    assert stored.user_id == second["user_id"]
+    assert stored.plan_json["summary"] == "Meena, you're aiming to reach 62kg"
@@ -0,0 +1,81 @@
+"""Grocery re-pricing from PRICE_TABLE and the budget breakdown buckets"""
+
+import pytest
+
+import main
+
+
+def priced(name, quantity):
+    """(repriced?, estimated_price) for one item whose AI price was -1"""
+    item = {"name": name, "quantity": quantity, "estimated_price": -1}
+    return main.price_grocery_item(item), item["estimated_price"]
+
+
+@pytest.mark.parametrize("quantity, price", [
+    ("2kg", 90),          # tomato is Rs 30-60/kg -> 45/kg midpoint
+    ("1.5 kg", 68),
+    ("500g", 22),
+    ("500 gms", 22),
+    ("1/2 kg", 22),       # not 2 kg
+    ("1 1/2 kg", 68),
+    ("2 x 500g", 45),     # pack count multiplies
+    ("2x500 g", 45),
+    ("3 × 1kg", 135),
+])
+def test_quantities_are_parsed(quantity, price):
+    assert priced("Tomato", quantity) == (True, price)
+
+
+@pytest.mark.parametrize("quantity", [
+    "500g x 2",           # a number after the unit - ambiguous, keep the AI price
+    "2 packs (500g)",
+    "1/0 kg",
+    "a few",
+    "",
+])
+def test_unparseable_quantities_keep_the_ai_price(quantity):
+    assert priced("Tomato", quantity) == (False, -1)
+
+
+def test_units_must_match_the_table():
+    assert priced("Milk", "7L") == (True, 438)
+    assert priced("Milk", "250 ml") == (True, 16)
+    assert priced("Milk", "2kg") == (False, -1)
+    assert priced("Eggs", "12 pieces") == (True, 80)
+
+
+def test_bunches_only_convert_for_leafy_greens():
+    assert priced("Spinach (Palak)", "2 bunches") == (True, 50)
+    assert priced("Tomato", "2 bunches") == (False, -1)
+    assert priced("Banana", "1 bunch") == (False, -1)
+
+
+def test_longest_item_name_wins():
+    # "wheat flour" (Rs 40-50) rather than a shorter overlapping key
+    assert priced("Whole wheat flour", "1kg") == (True, 45)
+
+
+def test_unknown_items_keep_the_ai_price():
+    assert priced("Dragon fruit", "1kg") == (False, -1)
+
+
+def test_price_range_is_filled_in():
+    item = {"name": "Paneer", "quantity": "250g", "estimated_price": 0}
+    assert main.price_grocery_item(item)
+    assert item["price_range"] == "Rs 88-112"
+
+
+@pytest.mark.parametrize("category, bucket", [
+    ("vegetables", "vegetables"),
+    ("fresh vegetables & fruits", "vegetables"),
+    ("dairy and vegetables", "vegetables"),   # table order decides ties
+    ("dairy & proteins", "dairy_proteins"),
+    ("eggs and chicken", "dairy_proteins"),
+    ("grains & pulses", "grains_pulses"),
+    ("atta and rice", "grains_pulses"),
+    ("spices and oils", "spices"),
+    ("snacks", "other"),
+    ("", "other"),
+])
+def test_grocery_bucket_precedence(category, bucket):
+    assert main.grocery_bucket(category) == bucket
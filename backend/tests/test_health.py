@@ -0,0 +1,11 @@
+"""Keep-alive health check"""
+
+
+def test_head_mirrors_get(client):
+    get = client.get("/health")
+    head = client.head("/health")
+    assert get.status_code == head.status_code == 200
+    assert get.json() == {"status": "healthy", "service": "active"}
+    assert head.content == b""
+    for header in ("content-type", "content-length", "cache-control"):
+        assert head.headers[header] == get.headers[header]
@@ -0,0 +1,71 @@
+"""Deterministic calorie/protein targets that go into the diet prompt"""
+
+import main
+
+
+def profile(**overrides):
+    fields = dict(age=30, gender="male", height_cm=175, weight_kg=80, target_weight_kg=72,
+                  goal="Weight Loss", goal_pace="balanced", diet_pref="Vegetarian", region="North Indian",
+                  budget="medium", medical_manual=[])
+    fields.update(overrides)
+    return main.UserProfile(**fields)
+
+
+def test_weight_loss_balanced_male():
+    # BMR 1748.75, maintenance 1.3x-1.4x, 22.5% deficit, protein 1.6-1.8 g/kg
+    assert main.compute_nutrition_targets(profile()) == {
+        "maintenance_low": 2250,
+        "maintenance_high": 2450,
+        "calories_low": 1850,
+        "calories_high": 1900,
+        "calorie_delta": -475,
+        "protein_low": 130,
+        "protein_high": 145,
+    }
+
+
+def test_calorie_floor_applies():
+    targets = main.compute_nutrition_targets(profile(
+        gender="female", age=25, height_cm=150, weight_kg=45, target_weight_kg=42, goal_pace="rapid"
+    ))
+    assert targets["calories_low"] == 1200
+
+
+def test_muscle_gain_adds_fixed_surplus():
+    # Maintenance 2360.8 + 350 kcal -> 2700 after rounding to 50; the delta is reported from the range midpoint
+    targets = main.compute_nutrition_targets(profile(goal="Muscle Gain", target_weight_kg=85))
+    assert (targets["calories_low"], targets["calories_high"], targets["calorie_delta"]) == (2700, 2750, 375)
+    assert (targets["protein_low"], targets["protein_high"]) == (135, 150)
+
+
+def test_pace_is_capped_by_age():
+    def targets(age, pace):
+        return main.compute_nutrition_targets(profile(age=age, goal_pace=pace))
+
+    assert targets(62, "rapid") == targets(62, "balanced")
+    assert targets(70, "rapid") == targets(70, "conservative")
+    assert targets(70, "balanced") == targets(70, "conservative")
+
+
+def test_unknown_pace_falls_back_to_balanced():
+    assert (main.compute_nutrition_targets(profile(goal_pace="turbo"))
+            == main.compute_nutrition_targets(profile(goal_pace="balanced")))
+
+
+def test_kidney_condition_lowers_protein_band():
+    for condition in ("Kidney stones", "CKD stage 2", "High creatinine", "renal issues"):
+        targets = main.compute_nutrition_targets(profile(medical_manual=[condition]))
+        assert (targets["protein_low"], targets["protein_high"]) == (65, 80), condition
+
+
+def test_maintenance_with_medical_condition_is_below_maintenance():
+    healthy = main.compute_nutrition_targets(profile(goal="Maintenance", target_weight_kg=80))
+    medical = main.compute_nutrition_targets(profile(goal="Maintenance", target_weight_kg=80, medical_manual=["Diabetes"]))
+    assert medical["calories_low"] < healthy["calories_low"]
+    assert medical["protein_high"] < healthy["protein_high"]
+
+
+def test_callers_get_their_own_copy():
+    targets = main.compute_nutrition_targets(profile())
+    targets["calories_low"] = 0
+    assert main.compute_nutrition_targets(profile())["calories_low"] == 1850
@@ -0,0 +1,83 @@
+"""Recipe videos: in-memory cache first, then the recipe_videos table, then YouTube"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+import main
+
+YOUTUBE_RESPONSE = {"items": [{
+    "id": {"videoId": "abc123"},
+    "snippet": {"title": "Palak Paneer Recipe", "channelTitle": "Ghar Ka Khana",
+                "thumbnails": {"high": {"url": "https://i.ytimg.com/abc123.jpg"}}},
+}]}
+
+
+class FakeYouTube:
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, url, params=None):
+        self.calls += 1
+        return SimpleNamespace(status_code=200, content=orjson.dumps(YOUTUBE_RESPONSE))
+
+
+@pytest.fixture
+def youtube(monkeypatch, db):
+    fake = FakeYouTube()
+    monkeypatch.setattr(main, "YOUTUBE_API_KEY", "test-youtube-key")
+    monkeypatch.setattr(main, "api_http_client", fake)
+    main.recipe_video_cache.clear()
+    db.query(main.RecipeVideo).delete()
+    db.commit()
+    return fake
+
+
+def fetch(client, meal_name="Palak Paneer"):
+    return client.post("/get-recipe-video", json={"meal_name": meal_name, "language": "hindi"}).json()
+
+
+def test_first_request_calls_youtube_and_stores_the_result(client, db, youtube):
+    video = fetch(client)
+    assert video["video_id"] == "abc123" and youtube.calls == 1
+    stored = db.get(main.RecipeVideo, "palak paneer_hindi")
+    assert stored.video_json["video_id"] == "abc123"
+
+
+def test_memory_hit_skips_youtube_and_the_store(client, youtube, monkeypatch):
+    fetch(client)
+    monkeypatch.setattr(main, "load_recipe_video", lambda key: pytest.fail("store read on a memory hit"))
+    assert fetch(client, "paneer,  PALAK")["video_id"] == "abc123"  # Same normalized key
+    assert youtube.calls == 1
+
+
+def test_stored_result_survives_a_cleared_memory_cache(client, youtube):
+    fetch(client)
+    main.recipe_video_cache.clear()  # e.g. a restart or another worker
+    assert fetch(client)["video_id"] == "abc123"
+    assert youtube.calls == 1
+    assert "palak paneer_hindi" in main.recipe_video_cache  # Promoted back into memory
+
+
+def test_stale_stored_result_is_fetched_again(client, db, youtube):
+    fetch(client)
+    main.recipe_video_cache.clear()
+    db.get(main.RecipeVideo, "palak paneer_hindi").created_at = (
+        datetime.utcnow() - main.RECIPE_VIDEO_DB_TTL - timedelta(days=1)
+    )
+    db.commit()
+    fetch(client)
+    assert youtube.calls == 2
+
+
+def test_fallbacks_are_not_cached(client, youtube, monkeypatch):
+    async def no_results(url, params=None):
+        youtube.calls += 1
+        return SimpleNamespace(status_code=200, content=orjson.dumps({"items": []}))
+
+    monkeypatch.setattr(youtube, "get", no_results)
+    assert fetch(client)["fallback"] is True
+    assert fetch(client)["fallback"] is True
+    assert youtube.calls == 2
@@ -223,6 +223,7 @@ export default function Dashboard() {
 
         const response = await axios.post(`${API_URL}/save-plan`, {
             user_id: state.userId || state.plan?.user_id,
+            plan_id: state.planId,
             phone: phone,
             title: planTitle,
             plan_json: JSON.stringify(state.plan),